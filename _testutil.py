@@ -0,0 +1,231 @@
+"""Helpers shared by the Playwright test scripts."""
+
+import os
+import time
+import weakref
+from collections import deque
+from functools import cache
+from pathlib import Path
+
+from playwright.sync_api import expect, TimeoutError as PlaywrightTimeoutError
+
+# Saved Google sign-in, written by record_auth.py
+AUTH_STATE = "auth.json"
+# KEEP_OPEN is for watching a run, so it also brings up a window
+HEADLESS = not os.environ.get("KEEP_OPEN")
+# Per-action delay in ms; only useful while watching a run, so off by default
+SLOW_MO = int(os.environ.get("SLOW_MO", "0"))
+# Chromium features the tests never use; skipping them trims browser startup
+LAUNCH_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-features=TranslateUI,BackForwardCache",
+]
+# Write ScreenshotRecorder shots out even when the run passes
+KEEP_SCREENSHOTS = bool(os.environ.get("KEEP_SCREENSHOTS"))
+
+
+def keep_open(seconds, page=None):
+    """
+    Keep the browser open for manual inspection, only when asked to.
+
+    Under PWDEBUG the page is paused in the Playwright Inspector until you
+    resume. Otherwise KEEP_OPEN=<n> holds for n seconds and any other
+    non-empty value holds for the script's own default. With neither set
+    (CI, plain pytest runs) this returns at once.
+    """
+    if page is not None and os.environ.get("PWDEBUG"):
+        page.pause()
+        return
+    value = os.environ.get("KEEP_OPEN")
+    if not value:
+        return
+    seconds = int(value) if value.isdigit() else seconds
+    print(f"\nBrowser open for {seconds}s for inspection...")
+    time.sleep(seconds)
+
+
+@cache
+def pdf_payload(path):
+    """
+    Read a PDF once and return it as a set_input_files payload.
+
+    Repeated uploads of the same file (extra tabs, retries) reuse the bytes
+    instead of having Playwright read the file from disk each time.
+    """
+    return {
+        "name": os.path.basename(path),
+        "mimeType": "application/pdf",
+        "buffer": Path(path).read_bytes()
+    }
+
+
+class ScreenshotRecorder:
+    """
+    Screenshots held in memory and only written to disk when wanted.
+
+    capture() grabs a JPEG straight away, so each shot still shows the
+    moment it was taken, but nothing is written until flush(): call it when
+    something went wrong, or set KEEP_SCREENSHOTS to keep passing runs' shots.
+    """
+
+    def __init__(self, page, directory="."):
+        self.page = page
+        self.directory = directory
+        self.shots = []
+
+    def capture(self, name):
+        self.shots.append((name, self.page.screenshot(type="jpeg", quality=60)))
+
+    def flush(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for name, data in self.shots:
+            Path(self.directory, f"{name}.jpg").write_bytes(data)
+        self.shots.clear()
+
+
+_button_locators = weakref.WeakKeyDictionary()
+
+
+def button(page, name, exact=False):
+    """
+    First button whose accessible name contains (or, with exact, is) name.
+
+    Uses Playwright's role lookup instead of a :has-text text scan, and
+    builds each page's locator once; later calls return the same object.
+    """
+    locators = _button_locators.setdefault(page, {})
+    key = (name, exact)
+    if key not in locators:
+        locators[key] = page.get_by_role("button", name=name, exact=exact).first
+    return locators[key]
+
+
+def present(locator, timeout=1000):
+    """
+    True if locator matches a visible element.
+
+    The count() check returns immediately, so a missing element costs one DOM
+    query instead of a visibility wait.
+    """
+    return locator.count() > 0 and locator.first.is_visible(timeout=timeout)
+
+
+DOM_COUNTS_JS = """(selectors) => Object.fromEntries(
+    Object.entries(selectors).map(([key, sel]) => [key, document.querySelectorAll(sel).length])
+)"""
+
+
+def dom_counts(page, selectors):
+    """
+    Count matches for several selectors in one round-trip.
+
+    selectors maps a name to a CSS selector; the result maps the same names
+    to how many elements each one matched.
+    """
+    return page.evaluate(DOM_COUNTS_JS, selectors)
+
+
+APP_READY_JS = "() => window.__APP_READY === true || document.querySelector('#root')?.children.length > 0"
+
+
+def wait_for_app(page, timeout=15000):
+    """Block until the React app has mounted (it sets window.__APP_READY)."""
+    page.wait_for_function(APP_READY_JS, timeout=timeout)
+
+
+PDF_READY_JS = "() => window.pdfDoc && document.querySelector('canvas') !== null"
+
+
+def wait_for_pdf(page, timeout=15000):
+    """Block until PDF.js has parsed the document and drawn a canvas."""
+    page.wait_for_function(PDF_READY_JS, timeout=timeout)
+
+
+def wait_for_canvas(canvas, timeout=8000):
+    """
+    Poll until the canvas locator matches something; False if it never does.
+
+    One canvas per rendered page, so this checks the first match rather than
+    an exact count.
+    """
+    try:
+        expect(canvas.first).to_be_attached(timeout=timeout)
+        return True
+    except AssertionError:
+        return False
+
+
+def wait_for_visible(locator, timeout=5000):
+    """
+    Wait for locator to become visible; False if it doesn't within timeout.
+
+    expect() retries on its own, so callers can drop the sleep they used to
+    put before a one-shot is_visible().
+    """
+    try:
+        expect(locator).to_be_visible(timeout=timeout)
+        return True
+    except AssertionError:
+        return False
+
+
+def wait_for_highlight(page, selector, timeout=5000):
+    """
+    Wait for a citation highlight matching selector; False on timeout.
+
+    The predicate is re-checked inside the page, so this returns within a
+    frame of the highlight (or its persistent class) appearing.
+    """
+    try:
+        page.wait_for_function(
+            "(sel) => document.querySelector(sel) !== null", arg=selector, timeout=timeout
+        )
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+KEPT_CONSOLE_TYPES = frozenset({"error", "warning"})
+
+
+def attach_listeners(page, *, errors_only=True, pattern=None, sink=print, max_logs=200):
+    """
+    Collect console messages and uncaught page errors.
+
+    Returns (logs, errors): logs holds "[type] text" for the last max_logs
+    kept console messages, errors the text of the last max_logs console
+    errors and page exceptions. Both are bounded deques, so a chatty page
+    held open for inspection doesn't grow them without limit. With
+    errors_only, anything but errors and warnings is dropped on arrival,
+    unless its text matches the compiled regex pattern. Each kept line is
+    also passed to sink (None to stay quiet).
+    """
+    logs = deque(maxlen=max_logs)
+    errors = deque(maxlen=max_logs)
+
+    def on_console(msg):
+        msg_type = msg.type
+        text = msg.text
+        if (errors_only and msg_type not in KEPT_CONSOLE_TYPES
+                and (pattern is None or not pattern.search(text))):
+            return
+        line = f"[{msg_type}] {text}"
+        logs.append(line)
+        if msg_type == "error":
+            errors.append(text)
+        if sink is not None:
+            sink(line)
+
+    def on_page_error(error):
+        errors.append(str(error))
+        if sink is not None:
+            sink(f"[pageerror] {error}")
+
+    page.on("console", on_console)
+    page.on("pageerror", on_page_error)
+    return logs, errors
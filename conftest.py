@@ -0,0 +1,121 @@
+"""
+Shared Playwright fixtures for the browser test scripts.
+
+One Chromium process is launched per test session; every test gets its own
+fresh context and page, so tests stay isolated without paying a browser
+cold start each.
+
+The scripts are independent, so they can run in parallel with pytest-xdist:
+
+    pytest -n 4 --dist=loadfile test_*.py
+
+This needs pytest-xdist (pip install pytest-xdist). Each worker (gw0, gw1,
+...) talks to its own app instance on port 5002 + N, so serve public/ on
+5002, 5003, ... first. Without xdist everything goes to 5002. The hosting
+emulator copes fine with several browsers at once, so APP_URL=<url> points
+every worker at one shared server instead.
+
+Workers never share browser state: each has its own browser and every test
+a fresh in-memory context, and the saved sign-in (auth.json) is only read.
+
+Runs are headless and don't pause; set KEEP_OPEN=1 (or KEEP_OPEN=<seconds>)
+to get a visible browser that stays open at the end of each test, and
+SLOW_MO=<ms> to slow every action down while watching. A failing test
+leaves a screenshot in test-results/; TRACE=1 also keeps a Playwright trace
+of it there (open with `playwright show-trace`).
+
+Pages open at a fixed 800x600 with service workers blocked, which keeps
+layout and paint cheap and stops a cached worker from serving stale assets.
+Tests marked no_images also have image requests aborted; use it only where
+nothing looks at rendered pictures.
+"""
+
+import os
+
+import pytest
+from playwright.sync_api import sync_playwright
+
+from _testutil import AUTH_STATE, HEADLESS, LAUNCH_ARGS, SLOW_MO
+
+
+APP_HOST = "http://127.0.0.1"
+APP_BASE_PORT = 5002
+# Failure artifacts (screenshots, and traces with TRACE=1) land here
+ARTIFACTS_DIR = "test-results"
+TRACE = bool(os.environ.get("TRACE"))
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 800, "height": 600},
+    "service_workers": "block",
+}
+IMAGE_ROUTE = "**/*.{png,jpg,jpeg,gif,webp}"
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "no_images: abort image requests for this test's page"
+    )
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    # Expose each phase's report on the item so fixtures can see failures
+    outcome = yield
+    report = outcome.get_result()
+    setattr(item, f"rep_{report.when}", report)
+
+
+@pytest.fixture(scope="session")
+def app_url():
+    if os.environ.get("APP_URL"):
+        return os.environ["APP_URL"]
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    return f"{APP_HOST}:{APP_BASE_PORT + int(worker[2:])}"
+
+
+@pytest.fixture(scope="session")
+def browser():
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=HEADLESS, slow_mo=SLOW_MO, args=LAUNCH_ARGS)
+        yield browser
+        browser.close()
+
+
+def _page_in(context, request):
+    """
+    Yield a page in context, keeping artifacts only if the test fails.
+
+    A failing test gets a screenshot, plus a Playwright trace when TRACE is
+    set; passing tests write nothing.
+    """
+    if request.node.get_closest_marker("no_images"):
+        # PDF pages are drawn onto canvases, so this only skips app images
+        context.route(IMAGE_ROUTE, lambda route: route.abort())
+    if TRACE:
+        context.tracing.start(screenshots=True, snapshots=True)
+    page = context.new_page()
+    yield page
+
+    report = getattr(request.node, "rep_call", None)
+    failed = report is not None and report.failed
+    if failed:
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        page.screenshot(path=os.path.join(ARTIFACTS_DIR, f"{request.node.name}.png"))
+    if TRACE:
+        trace_path = os.path.join(ARTIFACTS_DIR, f"{request.node.name}-trace.zip")
+        context.tracing.stop(path=trace_path if failed else None)
+    context.close()
+
+
+@pytest.fixture
+def page(browser, request):
+    yield from _page_in(browser.new_context(**CONTEXT_OPTIONS), request)
+
+
+@pytest.fixture
+def signed_in_page(browser, request):
+    """Like page, but starts from the sign-in saved by record_auth.py if there is one."""
+    if os.path.exists(AUTH_STATE):
+        context = browser.new_context(storage_state=AUTH_STATE, **CONTEXT_OPTIONS)
+    else:
+        context = browser.new_context(**CONTEXT_OPTIONS)
+    yield from _page_in(context, request)
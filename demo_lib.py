@@ -0,0 +1,180 @@
+"""
+Shared Playwright flow for the PDF highlight demo.
+
+demo_highlights.py is the command-line entry point; other scripts can call
+run_highlight_demo() directly, e.g. once per PDF.
+"""
+
+import os
+import shutil
+from playwright.sync_api import sync_playwright
+
+# Browser profile kept between runs so caches and the pdf.js worker stay warm
+PROFILE_DIR = os.path.expanduser("~/.cache/cerebellar-demo")
+
+
+def run_highlight_demo(pdf_path, app_url, timeout=30000, slow_mo=0, headless=False,
+                       hold=60, fresh=False, cdp_endpoint=None, profile_dir=PROFILE_DIR):
+    """Load a PDF, run Fill All and exercise the citation Locate highlights.
+
+    hold is how many seconds to keep the browser open at the end (-1 waits
+    until the page is closed). Returns the Locate button count, the final
+    DOM counts and any JavaScript errors seen.
+    """
+    print(f"\n{'='*70}")
+    print("CEREBELLAR EXTRACTION - PDF HIGHLIGHT DEMO")
+    print(f"{'='*70}")
+    print(f"PDF: {os.path.basename(pdf_path)}")
+    print(f"URL: {app_url}")
+    print(f"{'='*70}\n")
+
+    if fresh:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+    with sync_playwright() as p:
+        if cdp_endpoint:
+            # Reuse a warm Chrome; skips browser launch and driver-side setup
+            browser = p.chromium.connect_over_cdp(cdp_endpoint, slow_mo=slow_mo)
+            context = browser.contexts[0] if browser.contexts else browser.new_context()
+            page = context.new_page()
+            page.set_viewport_size({'width': 1400, 'height': 900})
+            close = page.close
+        else:
+            context = p.chromium.launch_persistent_context(
+                user_data_dir=profile_dir,
+                headless=headless,
+                slow_mo=slow_mo,
+                viewport={'width': 1400, 'height': 900}
+            )
+            page = context.pages[0] if context.pages else context.new_page()
+            close = context.close
+        page.set_default_timeout(timeout)
+
+        # Capture errors: uncaught exceptions, plus console.error calls
+        errors = []
+
+        def on_console(msg):
+            if msg.type != "error":
+                return
+            if "404" not in msg.text:
+                errors.append(msg.text)
+
+        page.on("pageerror", lambda exc: errors.append(str(exc)))
+        page.on("console", on_console)
+
+        print("1️⃣ Loading application...")
+        page.goto(app_url, wait_until="domcontentloaded")
+        page.wait_for_selector("#root", state="visible")
+        page.wait_for_function("() => window.__APP_READY === true", timeout=10000)
+        print("   ✅ App loaded\n")
+
+        print("2️⃣ Uploading PDF...")
+        file_input = page.locator("input[type='file']").first
+        file_input.set_input_files(pdf_path)
+
+        # Wait for PDF to render (canvas elements appear)
+        canvas = page.locator("canvas")
+        try:
+            canvas.first.wait_for(state="visible", timeout=10000)
+            print(f"   ✅ PDF rendered ({canvas.count()} canvas elements)\n")
+        except Exception:
+            print("   ⚠️ PDF may not have rendered\n")
+
+        print("3️⃣ Running 'Fill All' AI extraction...")
+        fill_btn = page.locator("button:has-text('Fill All')").first
+        if fill_btn.is_visible():
+            fill_btn.click()
+            print("   ⏳ Waiting for AI extraction...")
+            # Wait for extraction to complete (button becomes enabled again or loading indicator disappears)
+            try:
+                page.wait_for_function(
+                    "() => !document.querySelector('.loading-indicator') && !document.querySelector('[data-loading=\"true\"]')",
+                    timeout=60000
+                )
+            except Exception:
+                pass  # Continue even if timeout - extraction may have completed
+            print("   ✅ Extraction complete\n")
+        else:
+            print("   ⚠️ Fill All button not found\n")
+
+        print("4️⃣ Looking for citation 'Locate' buttons...")
+        locate_btns = page.locator("button:has-text('📍'), button:has-text('Locate')")
+        btn_count = locate_btns.count()
+        print(f"   Found {btn_count} locate buttons")
+
+        if btn_count > 0:
+            print("\n5️⃣ Clicking first Locate button to show highlight...")
+            locate_btns.first.click()
+
+            # Wait for highlight element to appear
+            highlight = page.locator(".citation-jump-highlight")
+            try:
+                highlight.first.wait_for(state="visible", timeout=5000)
+                print("   ✅ YELLOW HIGHLIGHT CREATED!")
+                print("   📍 Watch the highlight transition to a dashed border...")
+
+                # Wait for persistent class to be added
+                persistent = page.locator(".citation-jump-highlight.persistent")
+                try:
+                    persistent.first.wait_for(state="visible", timeout=5000)
+                    print("   ✅ HIGHLIGHT TRANSITIONED TO PERSISTENT BORDER!")
+                except Exception:
+                    print("   ⚠️ Persistent state not detected (highlight may still be visible)")
+            except Exception:
+                print("   ⚠️ No highlight visible (may need sourceText from extraction)")
+
+            # Try clicking more locate buttons
+            if btn_count > 1:
+                print(f"\n6️⃣ Clicking more Locate buttons to show multiple highlights...")
+                for i in range(min(3, btn_count)):
+                    locate_btns.nth(i).click()
+                    print(f"   Clicked button {i+1}")
+        else:
+            print("   ℹ️ No Locate buttons found. This means:")
+            print("      - The extraction didn't find source citations, OR")
+            print("      - The citation cards need to be expanded")
+
+        # Check highlights and citation cards in one round-trip
+        print("\n7️⃣ Checking highlights and citation cards...")
+        dom_counts = page.evaluate("""() => ({
+            canvas: document.querySelectorAll('canvas').length,
+            highlights: document.querySelectorAll('.citation-jump-highlight').length,
+            persistent: document.querySelectorAll('.citation-jump-highlight.persistent').length,
+            cards: document.querySelectorAll("[class*='citation'], [class*='source']").length
+        })""")
+        print(f"   Canvas elements: {dom_counts['canvas']}")
+        print(f"   Total highlights: {dom_counts['highlights']} ({dom_counts['persistent']} persistent)")
+        if dom_counts['cards'] > 0:
+            print(f"   Found {dom_counts['cards']} citation-related elements")
+        else:
+            print("   No citation cards visible")
+
+        # Show any errors
+        if errors:
+            print("\n⚠️ JavaScript errors detected:")
+            for err in errors[:5]:
+                print(f"   - {err[:100]}")
+        else:
+            print("\n✅ No JavaScript errors!")
+
+        print(f"\n{'='*70}")
+        if hold < 0:
+            print("DEMO COMPLETE - Close the browser window when done inspecting")
+        else:
+            print(f"DEMO COMPLETE - Browser will stay open for {hold} seconds for inspection")
+        print(f"{'='*70}")
+        if hold:
+            print("\nTry:")
+            print("  - Scroll through the PDF")
+            print("  - Click on citation 'Locate' buttons to add more highlights")
+            print("  - Hover over highlights to see tooltips")
+            print("  - Click on highlights to remove them")
+
+        # Keep browser open for inspection
+        if hold < 0:
+            page.wait_for_event("close", timeout=0)
+        elif hold:
+            page.wait_for_timeout(hold * 1000)
+        close()
+
+    return {"locate_buttons": btn_count, "dom_counts": dom_counts, "errors": errors}
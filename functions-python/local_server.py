@@ -7,83 +7,341 @@ Usage: python local_server.py
 Server runs on http://localhost:5003
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
+from urllib.parse import parse_qsl, urlsplit
 import json
 import base64
+import gzip
+import hashlib
 import io
+import os
+import fitz  # PyMuPDF
 import pdfplumber
 import re
+import threading
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+# Number of parsed PDFs kept in memory. A client typically calls several
+# endpoints for the same document, so each one reuses the first parse.
+PARSE_CACHE_SIZE = 8
+
+# pdfminer is pure Python, so pages are parsed in worker processes.
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# DPI used to rasterize pages for figure crops
+FIGURE_RESOLUTION = 150
+
+TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+# Section headings as one alternation; the named group that matched is the
+# section name. MULTILINE lets one finditer pass scan a whole page, with the
+# surrounding [^\S\n]* standing in for line.strip().
+_SECTION_RE = re.compile(
+    r'^[^\S\n]*(?:'
+    r'(?P<abstract>abstract)'
+    r'|(?P<introduction>introduction|background)'
+    r'|(?P<methods>methods|patients|materials|study design|subjects'
+    r'|patients and methods|materials and methods)'
+    r'|(?P<results>results)'
+    r'|(?P<discussion>discussion)'
+    r'|(?P<conclusion>conclusions?)'
+    r'|(?P<references>references|bibliography)'
+    r'|(?P<table>table[^\S\n]*\d.*)'
+    r'|(?P<figure>(?:figure|fig\.?)[^\S\n]*\d.*)'
+    r')[^\S\n]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def _page_text(page):
+    return page.get_text(sort=True)
+
+
+def _page_words(page):
+    # (x0, top, x1, bottom, text) in reading order
+    return [word[:5] for word in page.get_text("words", sort=True)]
+
+
+def _page_tables(page):
+    # The "lines" strategy needs ruling lines; text-only pages have none
+    if not (page.lines or page.rects or page.curves):
+        return []
+    return page.extract_tables(TABLE_SETTINGS)
+
+
+def _page_figures(page):
+    """Render every image on a page to a base64 PNG or JPEG."""
+    figures = []
+    if not page.images:
+        return figures
+
+    # Rasterize the page once and crop each figure in pixel space
+    page_img = page.to_image(resolution=FIGURE_RESOLUTION).original
+    scale = FIGURE_RESOLUTION / 72
+    page_x0, page_top = page.bbox[0], page.bbox[1]
+    img_byte_arr = io.BytesIO()
+
+    for img_idx, image in enumerate(page.images):
+        try:
+            # Get image bounding box
+            bbox = (image['x0'], image['top'], image['x1'], image['bottom'])
+
+            pil_img = page_img.crop((
+                round((bbox[0] - page_x0) * scale),
+                round((bbox[1] - page_top) * scale),
+                round((bbox[2] - page_x0) * scale),
+                round((bbox[3] - page_top) * scale),
+            ))
+
+            # Convert to base64. The bytes go straight to a browser, so use
+            # fast zlib settings; photographs (>256 colours) go out as JPEG.
+            img_byte_arr.seek(0)
+            img_byte_arr.truncate()
+            if pil_img.getcolors(256) is None:
+                img_format = 'jpeg'
+                pil_img.convert('RGB').save(img_byte_arr, format='JPEG', quality=85)
+            else:
+                img_format = 'png'
+                pil_img.save(img_byte_arr, format='PNG', compress_level=1)
+            with img_byte_arr.getbuffer() as encoded:
+                img_base64 = base64.b64encode(encoded).decode('ascii')
+
+            figures.append({
+                "page": page.page_number,
+                "image_base64": img_base64,
+                "format": img_format,
+                "bbox": list(bbox),
+                "width": image.get('width', 0),
+                "height": image.get('height', 0)
+            })
+        except Exception as e:
+            print(f"Error extracting image {img_idx} from page {page.page_number}: {e}")
+            continue
+    return figures
+
+
+# Text and word boxes come from MuPDF's C extractor; tables and figure
+# crops need pdfplumber's layout objects.
+FITZ_EXTRACTORS = {
+    "text": _page_text,
+    "words": _page_words,
+}
+
+PDFPLUMBER_EXTRACTORS = {
+    "tables": _page_tables,
+    "figures": _page_figures,
+}
+
+PAGE_EXTRACTORS = {**FITZ_EXTRACTORS, **PDFPLUMBER_EXTRACTORS}
+
+
+def _extract_page_range(kind, pdf_bytes, start, stop):
+    """Worker: open the PDF and run one extractor over pages [start, stop)."""
+    extract = PAGE_EXTRACTORS[kind]
+    if kind in FITZ_EXTRACTORS:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return [extract(doc[i]) for i in range(start, stop)]
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return [extract(page) for page in pdf.pages[start:stop]]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # Created on first use so spawned workers don't start pools of their own.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _pool
+
+
+@dataclass
+class ParsedPDF:
+    """A PDF plus per-page extraction results, filled in on first use."""
+    pdf_bytes: bytes
+    page_sizes: list
+    results: dict = field(default_factory=dict)
+    locks: dict = field(default_factory=lambda: {kind: threading.Lock() for kind in PAGE_EXTRACTORS})
+
+    @property
+    def page_count(self):
+        return len(self.page_sizes)
+
+    def pages(self, kind):
+        """Return the per-page results for `kind` ("text", "words", ...)."""
+        # Concurrent requests for the same kind wait for one extraction
+        # instead of each running their own.
+        with self.locks[kind]:
+            if kind not in self.results:
+                self.results[kind] = self._extract(kind)
+        return self.results[kind]
+
+    def _extract(self, kind):
+        # One contiguous batch of pages per worker, so each worker receives
+        # the PDF bytes and opens the document only once.
+        n = self.page_count
+        batch = -(-n // MAX_WORKERS) or 1
+        starts = range(0, n, batch)
+        if len(starts) <= 1 and kind in PDFPLUMBER_EXTRACTORS:
+            # A single batch can run in this thread. MuPDF is not
+            # thread-safe, so fitz work always goes to a worker process.
+            return _extract_page_range(kind, self.pdf_bytes, 0, n)
+
+        stops = [min(start + batch, n) for start in starts]
+        batches = _get_pool().map(
+            _extract_page_range, repeat(kind), repeat(self.pdf_bytes), starts, stops
+        )
+        return [result for batch_results in batches for result in batch_results]
+
+
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+
+def pdf_cache_key(pdf_bytes):
+    return hashlib.blake2b(pdf_bytes, digest_size=16).digest()
+
+
+def parse_pdf(pdf_key, pdf_bytes):
+    """Return the cached ParsedPDF for these bytes, keyed by content hash."""
+    with _parse_cache_lock:
+        parsed = _parse_cache.get(pdf_key)
+        if parsed is not None:
+            _parse_cache.move_to_end(pdf_key)
+            return parsed
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page_sizes = [(p.width, p.height) for p in pdf.pages]
+
+    with _parse_cache_lock:
+        # Another thread may have parsed the same PDF in the meantime
+        parsed = _parse_cache.setdefault(pdf_key, ParsedPDF(pdf_bytes=pdf_bytes, page_sizes=page_sizes))
+        _parse_cache.move_to_end(pdf_key)
+        if len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return parsed
+
+
+def dumps_json(obj):
+    """Serialize to UTF-8 JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
 
 class PDFHandler(BaseHTTPRequestHandler):
-    def _set_headers(self, status=200):
+    def _set_headers(self, status=200, content_length=None, content_encoding=None):
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        if content_length is not None:
+            self.send_header('Content-Length', str(content_length))
+        if content_encoding:
+            self.send_header('Content-Encoding', content_encoding)
+            self.send_header('Vary', 'Accept-Encoding')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
 
+    def _send_json(self, obj, status=200):
+        payload = dumps_json(obj)
+        content_encoding = None
+        if 'gzip' in self.headers.get('Accept-Encoding', '') and len(payload) >= GZIP_MIN_SIZE:
+            # Level 1 is several times faster than the default and most of
+            # the savings on JSON come from the first level anyway.
+            payload = gzip.compress(payload, compresslevel=1)
+            content_encoding = 'gzip'
+        self._set_headers(status, len(payload), content_encoding)
+        self.wfile.write(payload)
+
     def do_OPTIONS(self):
         self._set_headers()
 
     def do_POST(self):
         content_length = int(self.headers.get('Content-Length', 0))
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
         post_data = self.rfile.read(content_length)
 
+        url = urlsplit(self.path)
+        # Options come from the query string, or the JSON body alongside pdf_base64
+        options = dict(parse_qsl(url.query))
+
         try:
-            data = json.loads(post_data.decode('utf-8'))
-            pdf_base64 = data.get('pdf_base64')
+            if content_type == 'application/pdf':
+                # Raw upload: the body already is the PDF, no JSON/base64 pass
+                pdf_bytes = post_data
+            else:
+                data = json.loads(post_data)
+                pdf_base64 = data.pop('pdf_base64', None)
+                options.update(data)
+
+                if not pdf_base64:
+                    self._send_json({"error": "pdf_base64 required"}, 400)
+                    return
+
+                pdf_bytes = base64.b64decode(pdf_base64)
+                del data, pdf_base64, post_data
 
-            if not pdf_base64:
-                self._set_headers(400)
-                self.wfile.write(json.dumps({"error": "pdf_base64 required"}).encode())
+            if not pdf_bytes:
+                self._send_json({"error": "Empty PDF body"}, 400)
                 return
 
-            pdf_bytes = base64.b64decode(pdf_base64)
-
-            if self.path == '/extract_tables':
-                result = self.extract_tables(pdf_bytes)
-            elif self.path == '/extract_figures':
-                result = self.extract_figures(pdf_bytes)
-            elif self.path == '/extract_text_with_layout':
-                result = self.extract_text_with_layout(pdf_bytes)
-            elif self.path == '/detect_sections':
-                result = self.detect_sections(pdf_bytes)
-            elif self.path == '/extract_text_with_positions':
-                result = self.extract_text_with_positions(pdf_bytes)
+            parsed = parse_pdf(pdf_cache_key(pdf_bytes), pdf_bytes)
+
+            if url.path == '/extract_tables':
+                result = self.extract_tables(parsed)
+            elif url.path == '/extract_figures':
+                result = self.extract_figures(parsed)
+            elif url.path == '/extract_text_with_layout':
+                result = self.extract_text_with_layout(parsed)
+            elif url.path == '/detect_sections':
+                result = self.detect_sections(parsed)
+            elif url.path == '/extract_text_with_positions':
+                result = self.extract_text_with_positions(
+                    parsed, columnar=options.get('positions_format') == 'columnar'
+                )
             else:
-                self._set_headers(404)
-                self.wfile.write(json.dumps({"error": f"Unknown endpoint: {self.path}"}).encode())
+                self._send_json({"error": f"Unknown endpoint: {url.path}"}, 404)
                 return
 
-            self._set_headers(200)
-            self.wfile.write(json.dumps(result).encode())
+            self._send_json(result)
 
         except Exception as e:
             print(f"Error: {e}")
-            self._set_headers(500)
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
+            self._send_json({"error": str(e)}, 500)
 
-    def extract_tables(self, pdf_bytes):
+    def extract_tables(self, parsed):
         """Extract tables from PDF as structured data."""
         tables_result = []
 
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for i, page in enumerate(pdf.pages):
-                page_tables = page.extract_tables()
-                for j, table in enumerate(page_tables):
-                    if table:
-                        cleaned_table = [
-                            [cell if cell else "" for cell in row]
-                            for row in table
-                        ]
-                        tables_result.append({
-                            "page": i + 1,
-                            "table_index": j,
-                            "headers": cleaned_table[0] if cleaned_table else [],
-                            "rows": cleaned_table[1:] if len(cleaned_table) > 1 else [],
-                            "raw": cleaned_table
-                        })
+        for i, page_tables in enumerate(parsed.pages("tables")):
+            for j, table in enumerate(page_tables):
+                if table:
+                    cleaned_table = [
+                        [cell if cell else "" for cell in row]
+                        for row in table
+                    ]
+                    tables_result.append({
+                        "page": i + 1,
+                        "table_index": j,
+                        "headers": cleaned_table[0] if cleaned_table else [],
+                        "rows": cleaned_table[1:] if len(cleaned_table) > 1 else [],
+                        "raw": cleaned_table
+                    })
 
         return {
             "success": True,
@@ -91,36 +349,9 @@ class PDFHandler(BaseHTTPRequestHandler):
             "table_count": len(tables_result)
         }
 
-    def extract_figures(self, pdf_bytes):
+    def extract_figures(self, parsed):
         """Extract figures/images from PDF."""
-        figures = []
-
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for i, page in enumerate(pdf.pages):
-                for img_idx, image in enumerate(page.images):
-                    try:
-                        # Get image bounding box
-                        bbox = (image['x0'], image['top'], image['x1'], image['bottom'])
-
-                        # Crop image from page
-                        cropped = page.crop(bbox)
-                        img_obj = cropped.to_image(resolution=150)
-
-                        # Convert to base64
-                        img_byte_arr = io.BytesIO()
-                        img_obj.save(img_byte_arr, format='PNG')
-                        img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-
-                        figures.append({
-                            "page": i + 1,
-                            "image_base64": img_base64,
-                            "bbox": list(bbox),
-                            "width": image.get('width', 0),
-                            "height": image.get('height', 0)
-                        })
-                    except Exception as e:
-                        print(f"Error extracting image {img_idx} from page {i+1}: {e}")
-                        continue
+        figures = [fig for page_figures in parsed.pages("figures") for fig in page_figures]
 
         return {
             "success": True,
@@ -128,21 +359,20 @@ class PDFHandler(BaseHTTPRequestHandler):
             "figure_count": len(figures)
         }
 
-    def extract_text_with_layout(self, pdf_bytes):
+    def extract_text_with_layout(self, parsed):
         """Extract text from PDF with layout preservation."""
         pages_text = []
         full_text = ""
 
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text() or ""
-                pages_text.append({
-                    "page": i + 1,
-                    "text": page_text,
-                    "width": page.width,
-                    "height": page.height
-                })
-                full_text += f"\n\n--- Page {i + 1} ---\n\n{page_text}"
+        for i, page_text in enumerate(parsed.pages("text")):
+            width, height = parsed.page_sizes[i]
+            pages_text.append({
+                "page": i + 1,
+                "text": page_text,
+                "width": width,
+                "height": height
+            })
+            full_text += f"\n\n--- Page {i + 1} ---\n\n{page_text}"
 
         return {
             "success": True,
@@ -151,49 +381,31 @@ class PDFHandler(BaseHTTPRequestHandler):
             "page_count": len(pages_text)
         }
 
-    def detect_sections(self, pdf_bytes):
+    def detect_sections(self, parsed):
         """Detect document sections."""
-        SECTION_PATTERNS = [
-            (r'^abstract$', 'abstract'),
-            (r'^(introduction|background)$', 'introduction'),
-            (r'^(methods|patients|materials|study design|subjects)$', 'methods'),
-            (r'^(patients and methods|materials and methods)$', 'methods'),
-            (r'^results$', 'results'),
-            (r'^discussion$', 'discussion'),
-            (r'^(conclusion|conclusions)$', 'conclusion'),
-            (r'^(references|bibliography)$', 'references'),
-            (r'^table\s*\d', 'table'),
-            (r'^(figure|fig\.?)\s*\d', 'figure'),
-        ]
-
         sections = []
         current_section = "unknown"
         section_start = 0
         global_char_index = 0
+        page_num = 1
 
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                page_text = page.extract_text() or ""
-                lines = page_text.split('\n')
-
-                for line in lines:
-                    line_lower = line.strip().lower()
-
-                    for pattern, section_name in SECTION_PATTERNS:
-                        if re.match(pattern, line_lower, re.IGNORECASE):
-                            if current_section != "unknown":
-                                sections.append({
-                                    "name": current_section,
-                                    "start_char": section_start,
-                                    "end_char": global_char_index,
-                                    "page": page_num
-                                })
+        for page_num, page_text in enumerate(parsed.pages("text"), 1):
+            for match in _SECTION_RE.finditer(page_text):
+                heading_index = global_char_index + match.start()
+                if current_section != "unknown":
+                    sections.append({
+                        "name": current_section,
+                        "start_char": section_start,
+                        "end_char": heading_index,
+                        "page": page_num
+                    })
 
-                            current_section = section_name
-                            section_start = global_char_index
-                            break
+                current_section = match.lastgroup
+                section_start = heading_index
 
-                    global_char_index += len(line) + 1
+            # Offsets count each line plus its newline, as if the pages
+            # were joined with '\n'
+            global_char_index += len(page_text) + 1
 
         if current_section != "unknown":
             sections.append({
@@ -209,42 +421,67 @@ class PDFHandler(BaseHTTPRequestHandler):
             "section_count": len(sections)
         }
 
-    def extract_text_with_positions(self, pdf_bytes):
-        """Extract text with word-level position tracking."""
-        positions = []
-        full_text = ""
+    def extract_text_with_positions(self, parsed, columnar=False):
+        """Extract text with word-level position tracking.
+
+        With columnar=True, positions is one list per field instead of one
+        dict per word, which is much smaller to build and serialize.
+        """
+        texts, starts, ends, xs, ys, widths, heights, pages = ([] for _ in range(8))
+        text_chunks = []
         global_char_index = 0
         page_num = 1
 
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                words = page.extract_words()
-
-                for word in words:
-                    text = word['text']
-                    start_char = global_char_index
-                    end_char = global_char_index + len(text)
-
-                    positions.append({
-                        "text": text,
-                        "startChar": start_char,
-                        "endChar": end_char,
-                        "x": word['x0'],
-                        "y": word['top'],
-                        "width": word['x1'] - word['x0'],
-                        "height": word['bottom'] - word['top'],
-                        "page": page_num
-                    })
-
-                    full_text += text + " "
-                    global_char_index = len(full_text)
-
-                full_text += "\n\n"
-                global_char_index = len(full_text)
+        for page_num, words in enumerate(parsed.pages("words"), 1):
+            for x0, top, x1, bottom, text in words:
+                end_char = global_char_index + len(text)
+
+                texts.append(text)
+                starts.append(global_char_index)
+                ends.append(end_char)
+                xs.append(x0)
+                ys.append(top)
+                widths.append(x1 - x0)
+                heights.append(bottom - top)
+                pages.append(page_num)
+
+                text_chunks.append(text)
+                text_chunks.append(" ")
+                global_char_index = end_char + 1
+
+            text_chunks.append("\n\n")
+            global_char_index += 2
+
+        if columnar:
+            positions = {
+                "text": texts,
+                "startChar": starts,
+                "endChar": ends,
+                "x": xs,
+                "y": ys,
+                "width": widths,
+                "height": heights,
+                "page": pages
+            }
+        else:
+            positions = [
+                {
+                    "text": text,
+                    "startChar": start_char,
+                    "endChar": end_char,
+                    "x": x,
+                    "y": y,
+                    "width": width,
+                    "height": height,
+                    "page": page
+                }
+                for text, start_char, end_char, x, y, width, height, page
+                in zip(texts, starts, ends, xs, ys, widths, heights, pages)
+            ]
 
         return {
             "success": True,
-            "text": full_text.strip(),
+            "text": "".join(text_chunks).strip(),
             "positions": positions,
             "page_count": page_num
         }
@@ -255,7 +492,7 @@ class PDFHandler(BaseHTTPRequestHandler):
 
 def run_server(port=5003):
     server_address = ('', port)
-    httpd = HTTPServer(server_address, PDFHandler)
+    httpd = ThreadingHTTPServer(server_address, PDFHandler)
     print(f"PDF Processing Server running on http://localhost:{port}")
     print("Available endpoints:")
     print("  POST /extract_tables - Extract tables from PDF")
@@ -263,7 +500,8 @@ def run_server(port=5003):
     print("  POST /extract_text_with_layout - Extract text with layout")
     print("  POST /detect_sections - Detect document sections")
     print("  POST /extract_text_with_positions - Extract text with word positions")
-    print("\nRequest body: { \"pdf_base64\": \"...\" }")
+    print("\nRequest body: { \"pdf_base64\": \"...\" } or raw bytes with Content-Type: application/pdf")
+    print("Options go in the JSON body or query string, e.g. ?positions_format=columnar")
     httpd.serve_forever()
 
 
@@ -1,7 +1,8 @@
 """
 Python Cloud Functions for PDF Processing
 
-Uses pdfplumber for superior text and table extraction with layout preservation.
+Uses PyMuPDF for fast text, word-position and table extraction, and
+pdfplumber for cropping figures.
 Complements the Node.js Claude citation functions.
 
 SECURITY NOTES:
@@ -14,7 +15,10 @@ intentional for this research extraction tool because:
    production domain for deployment).
 
 2. Read-Only Operations: These functions only extract/analyze PDF content - they
-   don't modify any persistent state or access sensitive user data.
+   don't modify any persistent state or access sensitive user data. The
+   exceptions, uploading figures (return_mode "gcs") and reading PDFs by
+   gcs_uri, need a Firebase ID token and stay under the caller's own Storage
+   prefix (PDF_GCS_USER_PREFIX).
 
 3. Input Validation: All functions validate input and handle errors gracefully.
 
@@ -29,15 +33,191 @@ For production deployments with sensitive data, consider:
 
 from firebase_functions import https_fn, options
 from firebase_admin import initialize_app
-import pdfplumber
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, defaultdict
+from contextlib import closing
+from functools import cache, partial
+from itertools import repeat
 import io
 import json
 import base64
+import hashlib
 import os
+import re
+import threading
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import pybase64
+except ImportError:  # pragma: no cover - optional speedup
+    pybase64 = None
 
 initialize_app()
 
+# Optional Rust port of pdfplumber with the same page API. Opt in with
+# PDFPLUMBER_RS=1; if it isn't installed the pure-Python package is used.
+_pdfplumber_rs = None
+if os.environ.get('PDFPLUMBER_RS') == '1':
+    try:
+        import pdfplumber_rs as _pdfplumber_rs
+    except ImportError:
+        pass
+
+
+def _open_pdf(pdf_bytes):
+    """Open PDF bytes for pdfplumber-style access; use as a context manager."""
+    if _pdfplumber_rs is not None:
+        return closing(_pdfplumber_rs.PDF.open_bytes(pdf_bytes))
+    # Imported on first use: pdfplumber pulls in pdfminer.six, which is slow
+    # to load and not needed by the PyMuPDF-only endpoints
+    import pdfplumber
+
+    return pdfplumber.open(io.BytesIO(pdf_bytes))
+
+
+def _open_doc(pdf_bytes):
+    """Open PDF bytes as a PyMuPDF document; use as a context manager."""
+    import fitz
+
+    return fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+# Upper bound on workers used for per-page extraction, and the fewest pages
+# worth handing to a worker of their own. Worker processes each hold their
+# own copy of the PDF and PyMuPDF's buffers (~150 MB on large papers), so
+# they are capped separately to fit the 1 GB the process-backed endpoints get.
+MAX_PAGE_WORKERS = min(os.cpu_count() or 1, 8)
+MAX_PROCESS_WORKERS = min(MAX_PAGE_WORKERS, 4)
+MIN_PAGES_PER_WORKER = 4
+
+# One process pool per instance, started on first use and reused across
+# requests so each call doesn't pay for forking and tearing down workers
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=MAX_PROCESS_WORKERS)
+        return _process_pool
+
+
+def _reset_process_pool(pool):
+    """Drop a pool whose workers died so the next request starts a fresh one."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _count_pages(pdf_bytes):
+    with _open_doc(pdf_bytes) as doc:
+        return doc.page_count
+
+
+def _run_page_batch(process_page, pdf_bytes, start, stop):
+    with _open_pdf(pdf_bytes) as pdf:
+        return [process_page(pdf.pages[i], i) for i in range(start, stop)]
+
+
+def _run_doc_batch(process_page, pdf_bytes, start, stop):
+    with _open_doc(pdf_bytes) as doc:
+        return [process_page(doc[i], i) for i in range(start, stop)]
 
+
+def _map_pages(pdf_bytes, process_page, run_batch=_run_page_batch, processes=False):
+    """
+    Run process_page(page, page_index) over every page of a PDF in parallel.
+
+    Pages are split into one contiguous batch per worker and each batch opens
+    its own copy of the PDF, so no document object is shared between
+    workers. run_batch picks the library: _run_page_batch for pdfplumber
+    pages, _run_doc_batch for PyMuPDF pages. PyMuPDF is not thread-safe, and
+    neither is PDFium behind pdfplumber's to_image(), so use either with
+    processes=True (the shared process pool) and a picklable process_page. Returns the per-page results in page order.
+    """
+    page_count = _count_pages(pdf_bytes)
+    workers = MAX_PROCESS_WORKERS if processes else MAX_PAGE_WORKERS
+    batch = max(-(-page_count // workers), MIN_PAGES_PER_WORKER)
+    starts = range(0, page_count, batch)
+    if len(starts) <= 1:
+        return run_batch(process_page, pdf_bytes, 0, page_count)
+
+    stops = [min(start + batch, page_count) for start in starts]
+    args = (run_batch, repeat(process_page), repeat(pdf_bytes), starts, stops)
+    if processes:
+        pool = _get_process_pool()
+        try:
+            batches = list(pool.map(*args))
+        except BrokenProcessPool:
+            _reset_process_pool(pool)
+            raise
+    else:
+        with ThreadPoolExecutor(max_workers=len(starts)) as executor:
+            batches = list(executor.map(*args))
+    return [result for batch_results in batches for result in batch_results]
+
+
+# Extraction results are cached by PDF content hash, so re-sending the same
+# paper to a warm instance (e.g. text, then sections, then tables) skips the
+# parse. Results are treated as read-only once cached. Figure results carry
+# base64 images, so the cache is bounded by approximate size as well as count.
+RESULT_CACHE_SIZE = 32
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+_result_cache = OrderedDict()
+_result_cache_bytes = 0
+_result_cache_lock = threading.Lock()
+
+
+def _pdf_key(pdf_bytes):
+    return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+
+
+def _result_size(value):
+    """Approximate the payload size of a result by its strings and bytes."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_result_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_result_size(v) for v in value)
+    return 8
+
+
+def _cached(extract, pdf_bytes, *args):
+    """Return extract(pdf_bytes, *args), reusing an earlier result for the same PDF."""
+    global _result_cache_bytes
+    key = (extract.__name__, _pdf_key(pdf_bytes), *args)
+    with _result_cache_lock:
+        if key in _result_cache:
+            _result_cache.move_to_end(key)
+            return _result_cache[key][0]
+
+    result = extract(pdf_bytes, *args)
+    size = _result_size(result)
+    if size > RESULT_CACHE_BYTES:
+        return result
+
+    with _result_cache_lock:
+        if key not in _result_cache:
+            _result_cache[key] = (result, size)
+            _result_cache_bytes += size
+        while (len(_result_cache) > RESULT_CACHE_SIZE
+               or _result_cache_bytes > RESULT_CACHE_BYTES):
+            _, (_, evicted) = _result_cache.popitem(last=False)
+            _result_cache_bytes -= evicted
+    return result
+
+
+@cache
 def get_cors_origins():
     """Get CORS allowed origins from environment or use defaults for local dev."""
     origins_env = os.environ.get('CORS_ALLOWED_ORIGINS', '')
@@ -46,11 +226,199 @@ def get_cors_origins():
     # Default to localhost for development
     return ["http://localhost:3000", "http://localhost:5000", "http://localhost:5002"]
 
+
+def _json_response(obj, status=200):
+    """JSON response, encoded with orjson when it is installed."""
+    body = orjson.dumps(obj) if orjson is not None else json.dumps(obj)
+    return https_fn.Response(body, status=status, mimetype="application/json")
+
+
+def _ndjson_response(records):
+    """
+    Stream records as newline-delimited JSON, encoding one at a time.
+
+    The records are produced after the handler has returned its 200, so a
+    failure part-way through is sent as a final {"error": ...} line; a
+    stream without one is complete.
+    """
+    def encode(record):
+        if orjson is not None:
+            return orjson.dumps(record) + b"\n"
+        return (json.dumps(record) + "\n").encode('utf-8')
+
+    def lines():
+        try:
+            for record in records:
+                yield encode(record)
+        except Exception as e:
+            yield encode({"error": str(e)})
+
+    return https_fn.Response(lines(), mimetype="application/x-ndjson")
+
+
+# Encoder settings for highlight screenshots. Lossy formats are plenty for
+# evidence crops and are far quicker to encode and smaller to ship than PNG.
+IMAGE_FORMATS = {
+    "WEBP": ("image/webp", {"quality": 80, "method": 4}),
+    "JPEG": ("image/jpeg", {"quality": 85, "optimize": False}),
+    "PNG": ("image/png", {}),
+}
+
+
+def _encode_image(img, image_format="WEBP"):
+    """Encode a PIL image as base64, returning (base64, mime_type)."""
+    image_format = image_format.upper()
+    if image_format == "JPG":
+        image_format = "JPEG"
+    if image_format not in IMAGE_FORMATS:
+        image_format = "WEBP"
+    mime_type, save_options = IMAGE_FORMATS[image_format]
+    if image_format == "JPEG" and img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format=image_format, **save_options)
+    return base64.b64encode(buf.getvalue()).decode('utf-8'), mime_type
+
+
+def _allowed_gcs_buckets():
+    # Only buckets listed in PDF_GCS_BUCKETS (default: the project's default
+    # bucket) may be read, since these functions are publicly invokable
+    buckets_env = os.environ.get('PDF_GCS_BUCKETS', '')
+    if buckets_env:
+        return {bucket.strip() for bucket in buckets_env.split(',')}
+    from firebase_admin import storage
+    return {storage.bucket().name}
+
+
+# The admin SDK reads Storage without going through security rules, so a
+# gcs_uri is only honoured for a signed-in caller and only under their own
+# prefix ({uid} is the caller's Firebase user id)
+PDF_GCS_USER_PREFIX = os.environ.get('PDF_GCS_USER_PREFIX', 'users/{uid}/')
+
+
+def _request_uid(req):
+    """Return the uid from the request's Firebase ID token, or None if absent or invalid."""
+    from firebase_admin import auth
+
+    scheme, _, token = req.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return auth.verify_id_token(token)['uid']
+    except (ValueError, auth.InvalidIdTokenError, auth.CertificateFetchError):
+        return None
+
+
+def _download_gcs(gcs_uri, uid):
+    """Return the bytes at gs://bucket/path, or None if the URI isn't allowed for uid."""
+    from firebase_admin import storage
+
+    if not gcs_uri.startswith('gs://'):
+        return None
+    bucket_name, _, path = gcs_uri[len('gs://'):].partition('/')
+    if not path or bucket_name not in _allowed_gcs_buckets():
+        return None
+    if not path.startswith(PDF_GCS_USER_PREFIX.format(uid=uid)):
+        return None
+    return storage.bucket(bucket_name).blob(path).download_as_bytes()
+
+
+def _read_pdf_request(req, required=True):
+    """
+    Read the PDF and options from a request.
+
+    Accepts a multipart upload (PDF in the 'file' field, options as a JSON
+    string in an 'options' field) or a JSON body with pdf_base64 or gcs_uri.
+    Multipart avoids holding both the base64 text and the decoded bytes in
+    memory; gcs_uri skips base64 entirely for PDFs already in Cloud Storage,
+    and needs an "Authorization: Bearer <Firebase ID token>" header.
+
+    Returns (pdf_bytes, options, None) or (None, None, error_response).
+    With required=False a missing PDF gives (None, options, None).
+    """
+    if req.content_type and 'multipart' in req.content_type:
+        pdf_file = req.files.get('file')
+        data = json.loads(req.form.get('options') or '{}')
+        if not pdf_file:
+            if not required:
+                return None, data, None
+            return None, None, _json_response({"error": "No file provided"}, status=400)
+        return pdf_file.read(), data, None
+
+    data = req.get_json()
+    if data and 'gcs_uri' in data:
+        uid = _request_uid(req)
+        if uid is None:
+            return None, None, _json_response({"error": "gcs_uri requires a Firebase ID token"}, status=401)
+        pdf_bytes = _download_gcs(data.pop('gcs_uri'), uid)
+        if pdf_bytes is None:
+            return None, None, _json_response({"error": "gcs_uri not allowed"}, status=403)
+        return pdf_bytes, data, None
+    if not data or 'pdf_base64' not in data:
+        if not required and data is not None:
+            return None, data, None
+        return None, None, _json_response({"error": "pdf_base64 required"}, status=400)
+    # Drop our reference to the base64 text as soon as it's decoded
+    b64decode = pybase64.b64decode if pybase64 is not None else base64.b64decode
+    pdf_bytes = b64decode(data.pop('pdf_base64'))
+    return pdf_bytes, data, None
+
+
 # Set memory and timeout for PDF processing
 pdf_options = options.MemoryOption.GB_1
 timeout_options = options.SupportedRegion.US_CENTRAL1
 
 
+def _metadata_result(pdf_bytes):
+    # Only the xref, trailer and page tree are read; no content streams
+    with _open_doc(pdf_bytes) as doc:
+        pages = [
+            {"page": i + 1, "width": page.rect.width, "height": page.rect.height}
+            for i, page in enumerate(doc)
+        ]
+        return {
+            "success": True,
+            "metadata": doc.metadata,
+            "pages": pages,
+            "page_count": doc.page_count
+        }
+
+
+def _layout_from_doc(doc, page_numbers=None):
+    # Extract with PyMuPDF; sort=True keeps top-to-bottom reading order
+    pages_text = []
+    text_parts = []
+
+    if page_numbers is None:
+        indices = range(doc.page_count)
+    else:
+        indices = [n - 1 for n in page_numbers if 1 <= n <= doc.page_count]
+    for i in indices:
+        page = doc[i]
+        page_text = page.get_text("text", sort=True)
+        pages_text.append({
+            "page": i + 1,
+            "text": page_text,
+            "width": page.rect.width,
+            "height": page.rect.height
+        })
+        text_parts.append(f"\n\n--- Page {i + 1} ---\n\n")
+        text_parts.append(page_text)
+
+    return {
+        "success": True,
+        "text": "".join(text_parts).strip(),
+        "pages": pages_text,
+        "page_count": doc.page_count,
+        "returned_pages": len(pages_text)
+    }
+
+
+def _layout_result(pdf_bytes, page_numbers=None):
+    with _open_doc(pdf_bytes) as doc:
+        return _layout_from_doc(doc, page_numbers)
+
+
 @https_fn.on_request(
     memory=options.MemoryOption.MB_512,
     timeout_sec=120,
@@ -62,65 +430,88 @@ def extract_text_with_layout(req: https_fn.Request) -> https_fn.Response:
     Extract text from PDF with layout preservation.
     Better for section detection and structured data.
 
-    Request body: { "pdf_base64": "..." } or multipart file upload
-    Response: { "text": "...", "pages": [...], "page_count": N }
+    Request body: { "pdf_base64": "...", "pages": [1, 2], "include_text": true }
+        or multipart file upload. "pages" (1-based) limits extraction to those
+        pages; "include_text": false returns only page sizes and metadata.
+    Response: { "text": "...", "pages": [...], "page_count": N, "returned_pages": N }
+        page_count is always the document's; returned_pages counts "pages".
     """
     try:
         # Get PDF data
-        if req.content_type and 'multipart' in req.content_type:
-            pdf_file = req.files.get('file')
-            if not pdf_file:
-                return https_fn.Response(
-                    json.dumps({"error": "No file provided"}),
-                    status=400,
-                    mimetype="application/json"
-                )
-            pdf_bytes = pdf_file.read()
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+
+        if not data.get('include_text', True):
+            result = _cached(_metadata_result, pdf_bytes)
         else:
-            data = req.get_json()
-            if not data or 'pdf_base64' not in data:
-                return https_fn.Response(
-                    json.dumps({"error": "pdf_base64 required"}),
-                    status=400,
-                    mimetype="application/json"
-                )
-            pdf_bytes = base64.b64decode(data['pdf_base64'])
-
-        # Extract with pdfplumber
-        pages_text = []
-        full_text = ""
-
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text() or ""
-                pages_text.append({
-                    "page": i + 1,
-                    "text": page_text,
-                    "width": page.width,
-                    "height": page.height
-                })
-                full_text += f"\n\n--- Page {i + 1} ---\n\n{page_text}"
-
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "text": full_text.strip(),
-                "pages": pages_text,
-                "page_count": len(pages_text)
-            }),
-            mimetype="application/json"
-        )
+            page_numbers = data.get('pages')
+            if page_numbers is not None:
+                page_numbers = tuple(sorted({int(n) for n in page_numbers}))
+            result = _cached(_layout_result, pdf_bytes, page_numbers)
+
+        return _json_response(result)
 
     except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
+        return _json_response({"error": str(e)}, status=500)
+
+
+# find_tables settings for ruled tables, and the fallback for tables without lines
+TABLE_SETTINGS_LINES = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "snap_tolerance": 3,
+    "join_tolerance": 3,
+}
+TABLE_SETTINGS_TEXT = {
+    "vertical_strategy": "text",
+    "horizontal_strategy": "text",
+}
+
+
+def _find_tables(page, settings=TABLE_SETTINGS_LINES):
+    """Rows of each table PyMuPDF finds on a page; cells may be None."""
+    # The lines strategy only sees tables ruled with vector graphics, so a page
+    # with no drawings is skipped before find_tables extracts its characters
+    uses_lines = "lines" in (settings["vertical_strategy"], settings["horizontal_strategy"])
+    if uses_lines and not page.get_cdrawings():
+        return []
+    return [table.extract() for table in page.find_tables(**settings).tables]
+
+
+def _extract_page_tables(page, i):
+    tables = []
+    for j, table in enumerate(_find_tables(page)):
+        if table:  # Skip empty tables
+            # Clean None values
+            cleaned_table = [[cell or "" for cell in row] for row in table]
+            tables.append({
+                "page": i + 1,
+                "table_index": j,
+                "headers": cleaned_table[0] if cleaned_table else [],
+                "rows": cleaned_table[1:] if len(cleaned_table) > 1 else [],
+                "raw": cleaned_table
+            })
+    return tables
+
+
+def _tables_result(pdf_bytes):
+    tables_result = [
+        table
+        for page_tables in _map_pages(
+            pdf_bytes, _extract_page_tables, _run_doc_batch, processes=True
         )
+        for table in page_tables
+    ]
+    return {
+        "success": True,
+        "tables": tables_result,
+        "table_count": len(tables_result)
+    }
 
 
 @https_fn.on_request(
-    memory=options.MemoryOption.MB_512,
+    memory=options.MemoryOption.GB_1,
     timeout_sec=120,
     cors=options.CorsOptions(cors_origins=get_cors_origins(), cors_methods=["POST", "OPTIONS"]),
     invoker="public"  # Allow unauthenticated access
@@ -130,54 +521,96 @@ def extract_tables(req: https_fn.Request) -> https_fn.Response:
     Extract tables from PDF as structured data.
     Critical for medical papers with demographic and outcome tables.
 
-    Request body: { "pdf_base64": "..." }
+    Request body: { "pdf_base64": "..." } or multipart file upload
     Response: { "tables": [{"page": 1, "data": [[...], [...]]}, ...] }
     """
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+        result = _cached(_tables_result, pdf_bytes)
 
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
-        tables_result = []
-
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for i, page in enumerate(pdf.pages):
-                page_tables = page.extract_tables()
-                for j, table in enumerate(page_tables):
-                    if table:  # Skip empty tables
-                        # Clean None values
-                        cleaned_table = [
-                            [cell if cell else "" for cell in row]
-                            for row in table
-                        ]
-                        tables_result.append({
-                            "page": i + 1,
-                            "table_index": j,
-                            "headers": cleaned_table[0] if cleaned_table else [],
-                            "rows": cleaned_table[1:] if len(cleaned_table) > 1 else [],
-                            "raw": cleaned_table
-                        })
-
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "tables": tables_result,
-                "table_count": len(tables_result)
-            }),
-            mimetype="application/json"
-        )
+        return _json_response(result)
 
     except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+        return _json_response({"error": str(e)}, status=500)
+
+
+def _positions_from_doc(doc, columnar=False):
+    """
+    Word positions with their character offsets into the joined text.
+
+    Words are collected field by field; with columnar=True positions is
+    returned that way (one list per field), which is much smaller to build
+    and serialize than one dict per word.
+    """
+    texts, starts, ends, xs, ys, widths, heights, pages = ([] for _ in range(8))
+    text_parts = []
+    global_char_index = 0
+    page_num = 0
+
+    for page_num, page in enumerate(doc, 1):
+        # Get words with bounding boxes: (x0, y0, x1, y1, word, block, line, word_no)
+        words = page.get_text("words", sort=True)
+
+        for x0, top, x1, bottom, text, *_ in words:
+            end_char = global_char_index + len(text)
+
+            texts.append(text)
+            starts.append(global_char_index)
+            ends.append(end_char)
+            xs.append(x0)
+            ys.append(top)
+            widths.append(x1 - x0)
+            heights.append(bottom - top)
+            pages.append(page_num)
+
+            text_parts.append(text)
+            text_parts.append(" ")
+            global_char_index = end_char + 1
+
+        # Page separator
+        text_parts.append("\n\n")
+        global_char_index += 2
+
+    if columnar:
+        positions = {
+            "text": texts,
+            "startChar": starts,
+            "endChar": ends,
+            "x": xs,
+            "y": ys,
+            "width": widths,
+            "height": heights,
+            "page": pages
+        }
+    else:
+        positions = [
+            {
+                "text": text,
+                "startChar": start_char,
+                "endChar": end_char,
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+                "page": page
+            }
+            for text, start_char, end_char, x, y, width, height, page
+            in zip(texts, starts, ends, xs, ys, widths, heights, pages)
+        ]
+
+    return {
+        "success": True,
+        "text": "".join(text_parts).strip(),
+        "positions": positions,
+        "page_count": page_num
+    }
+
+
+def _positions_result(pdf_bytes, columnar=False):
+    with _open_doc(pdf_bytes) as doc:
+        return _positions_from_doc(doc, columnar)
 
 
 @https_fn.on_request(
@@ -191,7 +624,10 @@ def extract_text_with_positions(req: https_fn.Request) -> https_fn.Response:
     Extract text with character-level position tracking.
     Enables mapping Claude citation indices to PDF coordinates.
 
-    Request body: { "pdf_base64": "..." }
+    Request body: { "pdf_base64": "...", "positions_format": "columnar" }
+        or multipart file upload. "columnar" returns positions as one list
+        per field ({"text": [...], "x": [...], ...}) instead of one object
+        per word.
     Response: {
         "text": "...",
         "positions": [{"text": "...", "x": N, "y": N, "page": N, ...}],
@@ -199,63 +635,149 @@ def extract_text_with_positions(req: https_fn.Request) -> https_fn.Response:
     }
     """
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+        columnar = data.get('positions_format') == 'columnar'
+        result = _cached(_positions_result, pdf_bytes, columnar)
+
+        return _json_response(result)
+
+    except Exception as e:
+        return _json_response({"error": str(e)}, status=500)
+
+
+# Section headings as a single alternation; the name of the group that
+# matched is the section name. Table/figure headings only need the prefix.
+SECTION_RE = re.compile(
+    r'^(?:'
+    r'(?P<abstract>abstract)'
+    r'|(?P<introduction>introduction|background)'
+    r'|(?P<methods>methods|patients|materials|study design|subjects'
+    r'|patients and methods|materials and methods)'
+    r'|(?P<results>results)'
+    r'|(?P<discussion>discussion)'
+    r'|(?P<conclusion>conclusions?)'
+    r'|(?P<references>references|bibliography)'
+    r'|(?P<table>table\s*\d.*)'
+    r'|(?P<figure>(?:figure|fig\.?)\s*\d.*)'
+    r')\s*$',
+    re.IGNORECASE
+)
+
+
+# Caption lines for the enhanced table/figure extractors ("Table 1.",
+# "Tab 2:", "Figure 3.", "Fig. 4:"), each a single case-insensitive pattern
+TABLE_CAPTION_RE = re.compile(r'^Tab(?:le)?\s*\d+[.:]\s*(.+)$', re.IGNORECASE)
+FIGURE_CAPTION_RE = re.compile(r'^(?:Figure|Fig\s*\.?)\s*\d+[.:]\s*(.+)', re.IGNORECASE)
+
+# Runs of whitespace (including line breaks) inside table cells
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Outline entries are often numbered ("2. Methods", "IV. Results")
+TOC_NUMBER_RE = re.compile(r'^(?:\d+(?:\.\d+)*|[IVXLC]+)\.?\s+', re.IGNORECASE)
+
+
+def _toc_sections(doc):
+    """
+    Sections from the PDF outline (/Outlines), or [] if it names none we know.
 
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
-        positions = []
-        full_text = ""
-        global_char_index = 0
-
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Get words with bounding boxes
-                words = page.extract_words()
-
-                for word in words:
-                    text = word['text']
-                    start_char = global_char_index
-                    end_char = global_char_index + len(text)
-
-                    positions.append({
-                        "text": text,
-                        "startChar": start_char,
-                        "endChar": end_char,
-                        "x": word['x0'],
-                        "y": word['top'],
-                        "width": word['x1'] - word['x0'],
-                        "height": word['bottom'] - word['top'],
+    Character offsets still follow the page text so they match the text
+    scanning path, but no per-line matching is needed.
+    """
+    headings = []
+    for _level, title, page in doc.get_toc():
+        title = TOC_NUMBER_RE.sub('', title.strip())
+        match = SECTION_RE.match(title)
+        # Subheadings like "2.1 Patients" stay part of the section above them
+        if match and 1 <= page <= len(doc) and not (headings and headings[-1][1] == match.lastgroup):
+            headings.append((page, match.lastgroup, title.lower()))
+    if not headings:
+        return []
+
+    # Offset of each page in the joined text, and where each heading sits in it
+    page_offsets = []
+    page_texts = []
+    total = 0
+    for page in doc:
+        text = page.get_text("text", sort=True)
+        page_offsets.append(total)
+        page_texts.append(text.lower())
+        total += len(text) + 1
+
+    starts = []
+    for page, name, title in headings:
+        found = page_texts[page - 1].find(title)
+        starts.append((page_offsets[page - 1] + max(found, 0), page, name))
+    starts.sort()
+
+    # Same shape as the text path: a section closes where the next begins
+    sections = []
+    for (start, _page, name), (end, end_page, _name) in zip(starts, starts[1:]):
+        sections.append({"name": name, "start_char": start, "end_char": end, "page": end_page})
+    start, _page, name = starts[-1]
+    sections.append({"name": name, "start_char": start, "end_char": total, "page": len(doc)})
+    return sections
+
+
+def _sections_from_doc(doc):
+    current_section = "unknown"
+    section_start = 0
+    global_char_index = 0
+    page_num = 0
+
+    # Prefer the document outline; scan the text only when there isn't one
+    sections = _toc_sections(doc)
+    if sections:
+        return {
+            "success": True,
+            "sections": sections,
+            "section_count": len(sections),
+            "source": "outline"
+        }
+
+    for page_num, page in enumerate(doc, 1):
+        page_text = page.get_text("text", sort=True)
+        lines = page_text.split('\n')
+
+        for line in lines:
+            # Trailing whitespace is absorbed by the pattern
+            match = SECTION_RE.match(line.lstrip())
+            if match:
+                # Save previous section
+                if current_section != "unknown":
+                    sections.append({
+                        "name": current_section,
+                        "start_char": section_start,
+                        "end_char": global_char_index,
                         "page": page_num
                     })
 
-                    full_text += text + " "
-                    global_char_index = len(full_text)
-
-                # Page separator
-                full_text += "\n\n"
-                global_char_index = len(full_text)
-
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "text": full_text.strip(),
-                "positions": positions,
-                "page_count": page_num
-            }),
-            mimetype="application/json"
-        )
+                current_section = match.lastgroup
+                section_start = global_char_index
+
+            global_char_index += len(line) + 1
+
+    # Add final section
+    if current_section != "unknown":
+        sections.append({
+            "name": current_section,
+            "start_char": section_start,
+            "end_char": global_char_index,
+            "page": page_num
+        })
+
+    return {
+        "success": True,
+        "sections": sections,
+        "section_count": len(sections),
+        "source": "text"
+    }
 
-    except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+
+def _sections_result(pdf_bytes):
+    with _open_doc(pdf_bytes) as doc:
+        return _sections_from_doc(doc)
 
 
 @https_fn.on_request(
@@ -267,95 +789,111 @@ def extract_text_with_positions(req: https_fn.Request) -> https_fn.Response:
 def detect_sections(req: https_fn.Request) -> https_fn.Response:
     """
     Detect document sections (Abstract, Methods, Results, Discussion, etc.)
-    Returns section boundaries with character indices.
+    Returns section boundaries with character indices. Uses the PDF outline
+    when it has one and falls back to scanning the page text.
 
-    Request body: { "pdf_base64": "..." }
+    Request body: { "pdf_base64": "..." } or multipart file upload.
+        "include_text": false returns only page sizes and metadata.
     Response: { "sections": [{"name": "Results", "start_char": N, "end_char": N, "page": N}] }
     """
-    import re
-
-    SECTION_PATTERNS = [
-        (r'^abstract$', 'abstract'),
-        (r'^(introduction|background)$', 'introduction'),
-        (r'^(methods|patients|materials|study design|subjects)$', 'methods'),
-        (r'^(patients and methods|materials and methods)$', 'methods'),
-        (r'^results$', 'results'),
-        (r'^discussion$', 'discussion'),
-        (r'^(conclusion|conclusions)$', 'conclusion'),
-        (r'^(references|bibliography)$', 'references'),
-        (r'^table\s*\d', 'table'),
-        (r'^(figure|fig\.?)\s*\d', 'figure'),
-    ]
-
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+        if not data.get('include_text', True):
+            return _json_response(_cached(_metadata_result, pdf_bytes))
+        result = _cached(_sections_result, pdf_bytes)
 
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
-        sections = []
-        current_section = "unknown"
-        section_start = 0
-        global_char_index = 0
-
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                words = page.extract_words()
-                page_text = page.extract_text() or ""
-                lines = page_text.split('\n')
-
-                for line in lines:
-                    line_lower = line.strip().lower()
-
-                    for pattern, section_name in SECTION_PATTERNS:
-                        if re.match(pattern, line_lower, re.IGNORECASE):
-                            # Save previous section
-                            if current_section != "unknown":
-                                sections.append({
-                                    "name": current_section,
-                                    "start_char": section_start,
-                                    "end_char": global_char_index,
-                                    "page": page_num
-                                })
-
-                            current_section = section_name
-                            section_start = global_char_index
-                            break
-
-                    global_char_index += len(line) + 1
-
-        # Add final section
-        if current_section != "unknown":
-            sections.append({
-                "name": current_section,
-                "start_char": section_start,
-                "end_char": global_char_index,
-                "page": page_num
-            })
-
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "sections": sections,
-                "section_count": len(sections)
-            }),
-            mimetype="application/json"
-        )
+        return _json_response(result)
 
     except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+        return _json_response({"error": str(e)}, status=500)
+
+
+def _extract_page_figures(page, i):
+    figures = []
+    for image in page.images:
+        # Get image bounding box
+        bbox = (image['x0'], image['top'], image['x1'], image['bottom'])
+
+        # Crop image from page
+        cropped = page.crop(bbox)
+        img_obj = cropped.to_image(resolution=150)
+
+        # Convert to base64
+        img_byte_arr = io.BytesIO()
+        img_obj.save(img_byte_arr, format='PNG')
+        img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+
+        figures.append({
+            "page": i + 1,
+            "image_base64": img_base64,
+            "bbox": bbox,
+            "width": image['width'],
+            "height": image['height']
+        })
+    return figures
+
+
+# Pages sampled, the average characters per page below which a PDF is
+# treated as a scan (each page one full-page image with no text layer), and
+# the share of the page that image must cover
+SCANNED_SAMPLE_PAGES = 5
+SCANNED_MIN_CHARS_PER_PAGE = 100
+SCANNED_MIN_IMAGE_COVERAGE = 0.8
+
+
+def _is_page_image(page):
+    """True if the page is drawn as one image covering most of it."""
+    images = page.get_images()
+    if len(images) != 1:
+        return False
+    rects = page.get_image_rects(images[0][0])
+    if len(rects) != 1:
+        return False
+    page_area = abs(page.rect)
+    return page_area > 0 and abs(rects[0] & page.rect) / page_area >= SCANNED_MIN_IMAGE_COVERAGE
+
+
+def _is_scanned(pdf_bytes):
+    """
+    Whether the PDF looks like a scan. A text-poor paper made of charts or
+    slides still has separate figures worth cropping, so every sampled page
+    must also be a single near-full-page image.
+    """
+    with _open_doc(pdf_bytes) as doc:
+        sample = min(SCANNED_SAMPLE_PAGES, doc.page_count)
+        chars = sum(len(doc[i].get_text().strip()) for i in range(sample))
+        if chars >= SCANNED_MIN_CHARS_PER_PAGE * sample:
+            return False
+        return all(_is_page_image(doc[i]) for i in range(sample))
+
+
+def _figures_result(pdf_bytes, force=False):
+    # Cropping a scan's page images just re-renders the pages; skip it
+    if not force and _is_scanned(pdf_bytes):
+        return {
+            "success": True,
+            "figures": [],
+            "figure_count": 0,
+            "skipped_scanned": True
+        }
+
+    # Each figure is rendered with PDFium, so pages go to worker processes
+    figures = [
+        figure
+        for page_figures in _map_pages(pdf_bytes, _extract_page_figures, processes=True)
+        for figure in page_figures
+    ]
+    return {
+        "success": True,
+        "figures": figures,
+        "figure_count": len(figures)
+    }
 
 
 @https_fn.on_request(
-    memory=options.MemoryOption.MB_512,
+    memory=options.MemoryOption.GB_1,
     timeout_sec=120,
     cors=options.CorsOptions(cors_origins=get_cors_origins(), cors_methods=["POST", "OPTIONS"]),
     invoker="public"  # Allow unauthenticated access
@@ -365,59 +903,146 @@ def extract_figures(req: https_fn.Request) -> https_fn.Response:
     Extract figures/images from PDF.
     Returns base64 encoded images and their metadata.
 
-    Request body: { "pdf_base64": "..." }
+    Scanned PDFs (no text layer) return no figures with "skipped_scanned": true
+    unless "force_extract" is set.
+
+    Request body: { "pdf_base64": "...", "force_extract": false } or multipart file upload
     Response: { "figures": [{"page": N, "image_base64": "...", "bbox": [...]}] }
     """
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+        force = bool(data.get('force_extract', False))
+        result = _cached(_figures_result, pdf_bytes, force)
+
+        return _json_response(result)
+
+    except Exception as e:
+        return _json_response({"error": str(e)}, status=500)
+
+
+# Highlight screenshots are rendered with PyMuPDF by default. Setting
+# PDF_RENDER_BACKEND=pdfium renders whole pages with pypdfium2 instead, one
+# process per page, since neither library renders concurrently in threads.
+PDF_RENDER_BACKEND = os.environ.get('PDF_RENDER_BACKEND', 'fitz')
+MAX_RENDER_WORKERS = min(os.cpu_count() or 1, 4)
+
+
+def _pdfium_render_page(pdf_bytes, page_index, scale):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        return pdf[page_index].render(scale=scale, draw_annots=False).to_pil()
+    finally:
+        pdf.close()
+
+
+def _pdfium_render_pages(pdf_bytes, page_indices, scale):
+    """Render whole pages with PDFium in parallel; returns {page_index: PIL image}."""
+    page_indices = list(page_indices)
+    if len(page_indices) <= 1 or MAX_RENDER_WORKERS == 1:
+        return {i: _pdfium_render_page(pdf_bytes, i, scale) for i in page_indices}
+    with ProcessPoolExecutor(max_workers=min(MAX_RENDER_WORKERS, len(page_indices))) as executor:
+        images = executor.map(_pdfium_render_page, repeat(pdf_bytes), page_indices, repeat(scale))
+        return dict(zip(page_indices, images))
+
+
+def _render_clip(page, page_image, clip, scale, mat):
+    """
+    Render the clip (in PDF points) of a page, returning (image, x, y) where
+    x/y is the clip's pixel origin on the full page at this scale.
+    """
+    from PIL import Image
+
+    if page_image is not None:
+        box = (int(clip.x0 * scale), int(clip.y0 * scale),
+               int(clip.x1 * scale), int(clip.y1 * scale))
+        return page_image.crop(box), box[0], box[1]
+    pix = page.get_pixmap(matrix=mat, clip=clip)
+    # Hand the raw samples straight to PIL instead of a PNG round trip
+    mode = "RGBA" if pix.alpha else "RGB"
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples), pix.x, pix.y
+
+
+def _render_highlights(pdf_bytes, highlights, dpi, padding, image_format="WEBP", context_factor=3):
+    """
+    Render a screenshot for each highlight with a yellow box over its region.
+
+    context_factor * padding pixels of surrounding page are kept around the
+    padded highlight. Returns screenshot dicts in request order; highlights on
+    pages outside the document are skipped.
+    """
+    from PIL import ImageDraw
+    import fitz  # PyMuPDF
+
+    # Group highlights by page so each page is loaded only once
+    by_page = defaultdict(list)
+    for index, highlight in enumerate(highlights):
+        by_page[highlight.get('page', 1) - 1].append((index, highlight))  # 0-based
+
+    screenshots_by_index = {}
+
+    with _open_doc(pdf_bytes) as doc:
+        # Calculate scaling factor for DPI
+        scale = dpi / 72.0
+        mat = fitz.Matrix(scale, scale)
+
+        page_images = {}
+        if PDF_RENDER_BACKEND == 'pdfium':
+            page_images = _pdfium_render_pages(
+                pdf_bytes, [p for p in by_page if 0 <= p < len(doc)], scale
             )
 
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
-        figures = []
-
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for i, page in enumerate(pdf.pages):
-                for image in page.images:
-                    # Get image bounding box
-                    bbox = (image['x0'], image['top'], image['x1'], image['bottom'])
-                    
-                    # Crop image from page
-                    cropped = page.crop(bbox)
-                    img_obj = cropped.to_image(resolution=150)
-                    
-                    # Convert to base64
-                    img_byte_arr = io.BytesIO()
-                    img_obj.save(img_byte_arr, format='PNG')
-                    img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-
-                    figures.append({
-                        "page": i + 1,
-                        "image_base64": img_base64,
-                        "bbox": bbox,
-                        "width": image['width'],
-                        "height": image['height']
-                    })
+        for page_num, page_highlights in by_page.items():
+            if page_num < 0 or page_num >= len(doc):
+                continue
 
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "figures": figures,
-                "figure_count": len(figures)
-            }),
-            mimetype="application/json"
-        )
+            page = doc[page_num]
+            page_width = page.rect.width * scale
+            page_height = page.rect.height * scale
 
-    except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+            for index, highlight in page_highlights:
+                # Get highlight coordinates and scale them
+                x0 = highlight.get('x0', 0) * scale
+                y0 = highlight.get('y0', 0) * scale
+                x1 = highlight.get('x1', 100) * scale
+                y1 = highlight.get('y1', 50) * scale
+
+                # Add padding
+                x0 = max(0, x0 - padding)
+                y0 = max(0, y0 - padding)
+                x1 = min(page_width, x1 + padding)
+                y1 = min(page_height, y1 + padding)
+
+                # Render only the highlight region with context, not the page
+                context_padding = padding * context_factor
+                clip = fitz.Rect(
+                    x0 - context_padding, y0 - context_padding,
+                    x1 + context_padding, y1 + context_padding
+                ) / scale & page.rect
+                cropped, ox, oy = _render_clip(page, page_images.get(page_num), clip, scale, mat)
+
+                # Draw yellow highlight rectangle, relative to the clip origin
+                draw = ImageDraw.Draw(cropped, 'RGBA')
+                highlight_color = (255, 255, 0, 100)  # Yellow with transparency
+                draw.rectangle([x0 - ox, y0 - oy, x1 - ox, y1 - oy], fill=highlight_color)
+
+                img_base64, mime_type = _encode_image(cropped, image_format)
+
+                screenshots_by_index[index] = {
+                    "page": highlight.get('page', 1),
+                    "label": highlight.get('label', ''),
+                    "text": highlight.get('text', ''),
+                    "image_base64": img_base64,
+                    "mime_type": mime_type,
+                    "width": cropped.width,
+                    "height": cropped.height
+                }
+
+    # Keep screenshots in request order
+    return [screenshots_by_index[i] for i in sorted(screenshots_by_index)]
 
 
 @https_fn.on_request(
@@ -442,7 +1067,8 @@ def capture_highlights(req: https_fn.Request) -> https_fn.Response:
             }
         ],
         "dpi": 200,
-        "padding": 15
+        "padding": 15,
+        "image_format": "WEBP"  # or "JPEG" / "PNG"
     }
     Response: {
         "screenshots": [
@@ -451,259 +1077,99 @@ def capture_highlights(req: https_fn.Request) -> https_fn.Response:
                 "label": "Mortality Rate",
                 "text": "...",
                 "image_base64": "...",
+                "mime_type": "image/webp",
                 "width": N,
                 "height": N
             }
         ]
     }
     """
-    from PIL import Image, ImageDraw
-    import fitz  # PyMuPDF
-
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
-
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
         highlights = data.get('highlights', [])
         dpi = data.get('dpi', 200)
         padding = data.get('padding', 15)
+        image_format = data.get('image_format', 'WEBP')
 
         if not highlights:
-            return https_fn.Response(
-                json.dumps({"error": "highlights array required"}),
-                status=400,
-                mimetype="application/json"
-            )
-
-        screenshots = []
+            return _json_response({"error": "highlights array required"}, status=400)
 
-        # Open PDF with PyMuPDF for better rendering
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        screenshots = _render_highlights(pdf_bytes, highlights, dpi, padding, image_format)
 
-        for highlight in highlights:
-            page_num = highlight.get('page', 1) - 1  # Convert to 0-based
-            if page_num < 0 or page_num >= len(doc):
-                continue
+        return _json_response({
+            "success": True,
+            "screenshots": screenshots,
+            "screenshot_count": len(screenshots)
+        })
 
-            page = doc[page_num]
-
-            # Calculate scaling factor for DPI
-            scale = dpi / 72.0
-            mat = fitz.Matrix(scale, scale)
-
-            # Render page to image
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-
-            # Get highlight coordinates and scale them
-            x0 = highlight.get('x0', 0) * scale
-            y0 = highlight.get('y0', 0) * scale
-            x1 = highlight.get('x1', 100) * scale
-            y1 = highlight.get('y1', 50) * scale
-
-            # Add padding
-            x0 = max(0, x0 - padding)
-            y0 = max(0, y0 - padding)
-            x1 = min(img.width, x1 + padding)
-            y1 = min(img.height, y1 + padding)
-
-            # Draw yellow highlight rectangle
-            draw = ImageDraw.Draw(img, 'RGBA')
-            highlight_color = (255, 255, 0, 100)  # Yellow with transparency
-            draw.rectangle([x0, y0, x1, y1], fill=highlight_color)
-
-            # Crop to highlight region with context
-            context_padding = padding * 3
-            crop_x0 = max(0, x0 - context_padding)
-            crop_y0 = max(0, y0 - context_padding)
-            crop_x1 = min(img.width, x1 + context_padding)
-            crop_y1 = min(img.height, y1 + context_padding)
-
-            cropped = img.crop((crop_x0, crop_y0, crop_x1, crop_y1))
-
-            # Convert to base64
-            img_byte_arr = io.BytesIO()
-            cropped.save(img_byte_arr, format='PNG')
-            img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-
-            screenshots.append({
-                "page": highlight.get('page', 1),
-                "label": highlight.get('label', ''),
-                "text": highlight.get('text', ''),
-                "image_base64": img_base64,
-                "width": cropped.width,
-                "height": cropped.height
-            })
-
-        doc.close()
+    except Exception as e:
+        return _json_response({"error": str(e)}, status=500)
 
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "screenshots": screenshots,
-                "screenshot_count": len(screenshots)
-            }),
-            mimetype="application/json"
-        )
 
-    except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+IMAGE_MIME_TYPES = frozenset(mime_type for mime_type, _ in IMAGE_FORMATS.values())
+BASE64_RE = re.compile(r'[A-Za-z0-9+/]*={0,2}')
+# Fields _report_html reads from every screenshot
+SCREENSHOT_FIELDS = ("label", "text", "page", "image_base64")
 
 
-@https_fn.on_request(
-    memory=options.MemoryOption.GB_1,
-    timeout_sec=300,
-    cors=options.CorsOptions(cors_origins=get_cors_origins(), cors_methods=["POST", "OPTIONS"]),
-    invoker="public"
-)
-def generate_html_report(req: https_fn.Request) -> https_fn.Response:
+def _screenshots_error(screenshots):
     """
-    Generate an HTML report with extraction data and embedded screenshots.
-    Creates a self-contained HTML file with visual evidence.
+    Why client-supplied screenshots can't be embedded in a report, or None.
 
-    Request body: {
-        "pdf_base64": "...",
-        "extraction_data": { ... },  # CerebellarSDCSchema format
-        "highlights": [...],
-        "title": "Report Title",
-        "dpi": 150,
-        "padding": 20
-    }
-    Response: {
-        "html": "<!DOCTYPE html>...",
-        "screenshots": N,
-        "timestamp": "..."
-    }
+    Their image data and mime type go into an <img src> unescaped, so only
+    known image types and plain base64 are accepted. The report is streamed,
+    so a missing field has to be caught here, before the 200 is sent.
     """
-    from datetime import datetime
-    import fitz
-    from PIL import Image, ImageDraw
-
-    try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
-
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
-        extraction_data = data.get('extraction_data', {})
-        highlights = data.get('highlights', [])
-        title = data.get('title', 'Cerebellar Extraction Report')
-        dpi = data.get('dpi', 150)
-        padding = data.get('padding', 20)
-
-        # Generate screenshots for highlights
-        screenshots = []
-        if highlights:
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-            for highlight in highlights:
-                page_num = highlight.get('page', 1) - 1
-                if page_num < 0 or page_num >= len(doc):
-                    continue
-
-                page = doc[page_num]
-                scale = dpi / 72.0
-                mat = fitz.Matrix(scale, scale)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                img = Image.open(io.BytesIO(img_data))
-
-                x0 = highlight.get('x0', 0) * scale
-                y0 = highlight.get('y0', 0) * scale
-                x1 = highlight.get('x1', 100) * scale
-                y1 = highlight.get('y1', 50) * scale
-
-                x0 = max(0, x0 - padding)
-                y0 = max(0, y0 - padding)
-                x1 = min(img.width, x1 + padding)
-                y1 = min(img.height, y1 + padding)
-
-                draw = ImageDraw.Draw(img, 'RGBA')
-                draw.rectangle([x0, y0, x1, y1], fill=(255, 255, 0, 100))
-
-                context_padding = padding * 2
-                crop_x0 = max(0, x0 - context_padding)
-                crop_y0 = max(0, y0 - context_padding)
-                crop_x1 = min(img.width, x1 + context_padding)
-                crop_y1 = min(img.height, y1 + context_padding)
-
-                cropped = img.crop((crop_x0, crop_y0, crop_x1, crop_y1))
-
-                img_byte_arr = io.BytesIO()
-                cropped.save(img_byte_arr, format='PNG')
-                img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-
-                screenshots.append({
-                    "label": highlight.get('label', ''),
-                    "text": highlight.get('text', ''),
-                    "image_base64": img_base64,
-                    "page": highlight.get('page', 1)
-                })
-
-            doc.close()
-
-        # Generate HTML report
-        timestamp = datetime.now().isoformat()
-
-        # Build evidence HTML
-        evidence_html = ""
-        for i, shot in enumerate(screenshots):
-            evidence_html += f'''
-            <div class="evidence-card">
-                <h3>{shot['label']}</h3>
-                <p class="source-text">"{shot['text']}"</p>
-                <p class="page-ref">Page {shot['page']}</p>
-                <img src="data:image/png;base64,{shot['image_base64']}" alt="{shot['label']}" />
-            </div>
-            '''
+    if not isinstance(screenshots, list):
+        return "screenshots must be a list"
+    for shot in screenshots:
+        if not isinstance(shot, dict):
+            return "each screenshot must be an object"
+        missing = [key for key in SCREENSHOT_FIELDS if key not in shot]
+        if missing:
+            return f"screenshot missing {', '.join(missing)}"
+        if shot.get('mime_type', 'image/png') not in IMAGE_MIME_TYPES:
+            return f"unsupported screenshot mime_type: {shot.get('mime_type')!r}"
+        image_base64 = shot.get('image_base64')
+        if not isinstance(image_base64, str) or not BASE64_RE.fullmatch(image_base64):
+            return "screenshot image_base64 must be base64"
+    return None
+
+
+def _report_html(title, timestamp, extraction_data, screenshots):
+    """
+    Yield the report HTML in pieces. Each screenshot's base64 payload is its
+    own piece, so callers can stream it or join everything exactly once.
+    """
+    from html import escape
 
-        # Build extraction data HTML
-        def render_field(name, field):
-            if isinstance(field, dict):
-                if 'value' in field:
-                    source = field.get('sourceText', 'N/A')
-                    return f'''
-                    <tr>
-                        <td><strong>{name}</strong></td>
-                        <td>{field.get('value', 'N/A')}</td>
-                        <td class="source-cell">{source}</td>
-                    </tr>
-                    '''
-                else:
-                    rows = ""
-                    for k, v in field.items():
-                        rows += render_field(f"{name}.{k}", v)
-                    return rows
-            else:
-                return f'''
+    def render_field(name, field):
+        if isinstance(field, dict):
+            if 'value' in field:
+                source = field.get('sourceText', 'N/A')
+                yield f'''
                 <tr>
-                    <td><strong>{name}</strong></td>
-                    <td colspan="2">{field}</td>
+                    <td><strong>{escape(name)}</strong></td>
+                    <td>{escape(str(field.get('value', 'N/A')))}</td>
+                    <td class="source-cell">{escape(str(source))}</td>
                 </tr>
                 '''
+            else:
+                for k, v in field.items():
+                    yield from render_field(f"{name}.{k}", v)
+        else:
+            yield f'''
+            <tr>
+                <td><strong>{escape(name)}</strong></td>
+                <td colspan="2">{escape(str(field))}</td>
+            </tr>
+            '''
 
-        extraction_rows = ""
-        for section_name, section_data in extraction_data.items():
-            if isinstance(section_data, dict):
-                for field_name, field_value in section_data.items():
-                    extraction_rows += render_field(f"{section_name}.{field_name}", field_value)
+    title = escape(title)
 
-        html = f'''<!DOCTYPE html>
+    yield f'''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -815,16 +1281,38 @@ def generate_html_report(req: https_fn.Request) -> https_fn.Response:
                     <th>Source Text</th>
                 </tr>
             </thead>
-            <tbody>
-                {extraction_rows}
+            <tbody>'''
+
+    # Extraction data rows
+    for section_name, section_data in extraction_data.items():
+        if isinstance(section_data, dict):
+            for field_name, field_value in section_data.items():
+                yield from render_field(f"{section_name}.{field_name}", field_value)
+
+    yield f'''
             </tbody>
         </table>
     </section>
 
     <section>
         <h2>Visual Evidence ({len(screenshots)} screenshots)</h2>
-        <div class="evidence-section">
-            {evidence_html}
+        <div class="evidence-section">'''
+
+    # Evidence cards
+    for shot in screenshots:
+        label = escape(str(shot['label']))
+        yield f'''
+            <div class="evidence-card">
+                <h3>{label}</h3>
+                <p class="source-text">"{escape(str(shot['text']))}"</p>
+                <p class="page-ref">Page {escape(str(shot['page']))}</p>
+                <img alt="{label}" src="data:{shot.get('mime_type', 'image/png')};base64,'''
+        yield shot['image_base64']
+        yield '''" />
+            </div>
+            '''
+
+    yield '''
         </div>
     </section>
 
@@ -834,26 +1322,162 @@ def generate_html_report(req: https_fn.Request) -> https_fn.Response:
 </body>
 </html>'''
 
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "html": html,
-                "screenshots": len(screenshots),
-                "timestamp": timestamp
-            }),
-            mimetype="application/json"
-        )
+
+@https_fn.on_request(
+    memory=options.MemoryOption.GB_1,
+    timeout_sec=300,
+    cors=options.CorsOptions(cors_origins=get_cors_origins(), cors_methods=["POST", "OPTIONS"]),
+    invoker="public"
+)
+def generate_html_report(req: https_fn.Request) -> https_fn.Response:
+    """
+    Generate an HTML report with extraction data and embedded screenshots.
+    Creates a self-contained HTML file with visual evidence.
+
+    Request body: {
+        "pdf_base64": "...",
+        "extraction_data": { ... },  # CerebellarSDCSchema format
+        "highlights": [...],
+        "title": "Report Title",
+        "dpi": 150,
+        "padding": 20,
+        "image_format": "WEBP",
+        "screenshots": [...],  # optional, from capture_highlights
+        "response_format": "json"  # or "html" to stream the page itself
+    }
+    When "screenshots" is given they are embedded as-is, nothing is rendered
+    and pdf_base64 may be omitted.
+    Response ("json"): {
+        "html": "<!DOCTYPE html>...",
+        "screenshots": N,
+        "timestamp": "..."
+    }
+    """
+    from datetime import datetime
+
+    try:
+        pdf_bytes, data, error = _read_pdf_request(req, required=False)
+        if error:
+            return error
+        extraction_data = data.get('extraction_data', {})
+        highlights = data.get('highlights', [])
+        title = data.get('title', 'Cerebellar Extraction Report')
+        dpi = data.get('dpi', 150)
+        padding = data.get('padding', 20)
+        image_format = data.get('image_format', 'WEBP')
+
+        # Screenshots from an earlier capture_highlights call are reused as-is;
+        # otherwise render them from the highlights
+        screenshots = data.get('screenshots')
+        if screenshots is not None:
+            screenshots_error = _screenshots_error(screenshots)
+            if screenshots_error:
+                return _json_response({"error": screenshots_error}, status=400)
+        else:
+            if pdf_bytes is None:
+                return _json_response({"error": "pdf_base64 required"}, status=400)
+            screenshots = []
+            if highlights:
+                screenshots = _render_highlights(
+                    pdf_bytes, highlights, dpi, padding, image_format, context_factor=2
+                )
+
+        # Generate HTML report
+        timestamp = datetime.now().isoformat()
+
+        parts = _report_html(title, timestamp, extraction_data, screenshots)
+
+        # Stream the page itself rather than building it inside a JSON string
+        if data.get('response_format') == 'html':
+            return https_fn.Response(parts, mimetype="text/html")
+
+        return _json_response({
+            "success": True,
+            "html": "".join(parts),
+            "screenshots": len(screenshots),
+            "timestamp": timestamp
+        })
 
     except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+        return _json_response({"error": str(e)}, status=500)
+
+
+def _extract_page_tables_enhanced(page, page_num, detect_captions=False):
+    tables_result = []
+
+    # Find table captions on this page; the page text is only read for this
+    captions = []
+    if detect_captions:
+        for line in page.get_text("text", sort=True).split('\n'):
+            line = line.strip()
+            if TABLE_CAPTION_RE.match(line):
+                captions.append(line)
+
+    # Extract tables with settings for better structure
+    page_tables = _find_tables(page, TABLE_SETTINGS_LINES)
+
+    # Also try text-based extraction for tables without lines
+    if not page_tables:
+        page_tables = _find_tables(page, TABLE_SETTINGS_TEXT)
+
+    for j, table in enumerate(page_tables):
+        # A single row or single column is almost always a text-strategy false
+        # positive; drop it before paying for cell cleaning
+        if len(table) >= 2 and max(map(len, table)) >= 2:
+            # Clean None values and collapse internal whitespace
+            cleaned_table = [
+                [WHITESPACE_RE.sub(' ', cell).strip() if cell else "" for cell in row]
+                for row in table
+            ]
+
+            # Determine headers (first non-empty row). Cleaned
+            # cells have no surrounding whitespace, so any() suffices.
+            headers = []
+            data_rows = []
+            for row in cleaned_table:
+                if any(row):
+                    if not headers:
+                        headers = row
+                    else:
+                        data_rows.append(row)
+
+            # Match caption to table
+            caption = ""
+            if j < len(captions):
+                caption = captions[j]
+
+            tables_result.append({
+                "page": page_num + 1,
+                "table_index": j,
+                "caption": caption,
+                "headers": headers,
+                "rows": data_rows,
+                "raw": cleaned_table,
+                "column_count": len(headers) if headers else 0,
+                "row_count": len(cleaned_table)
+            })
+
+
+    return tables_result
+
+
+def _iter_tables_enhanced(pdf_bytes, detect_captions=False):
+    # Page by page, so only one page's tables are held at a time
+    with _open_doc(pdf_bytes) as doc:
+        for page_num, page in enumerate(doc):
+            yield from _extract_page_tables_enhanced(page, page_num, detect_captions)
+
+
+def _tables_enhanced_from_doc(doc, detect_captions=False):
+    return [
+        table
+        for page_num, page in enumerate(doc)
+        for table in _extract_page_tables_enhanced(page, page_num, detect_captions)
+    ]
 
 
 @https_fn.on_request(
-    memory=options.MemoryOption.MB_512,
+    memory=options.MemoryOption.GB_1,
     timeout_sec=120,
     cors=options.CorsOptions(cors_origins=get_cors_origins(), cors_methods=["POST", "OPTIONS"]),
     invoker="public"
@@ -863,7 +1487,12 @@ def extract_tables_enhanced(req: https_fn.Request) -> https_fn.Response:
     Enhanced table extraction with structure preservation and caption detection.
     Better handling of merged cells and complex table layouts.
 
-    Request body: { "pdf_base64": "...", "detect_captions": true }
+    Request body: { "pdf_base64": "...", "detect_captions": false, "response_format": "json" }
+        or multipart file upload. Captions are only looked for (which costs a
+        text pass per page) when "detect_captions" is true. With
+        "response_format": "ndjson" each table is streamed as one JSON line as
+        soon as its page is done; if extraction fails part-way the stream
+        ends with an {"error": "..."} line.
     Response: {
         "tables": [{
             "page": 1,
@@ -877,118 +1506,154 @@ def extract_tables_enhanced(req: https_fn.Request) -> https_fn.Response:
         }]
     }
     """
-    import re
-
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+        detect_captions = bool(data.get('detect_captions', False))
+
+        if data.get('response_format') == 'ndjson':
+            return _ndjson_response(_iter_tables_enhanced(pdf_bytes, detect_captions))
+
+        # Pages are independent, so spread them over worker processes
+        process_page = partial(_extract_page_tables_enhanced, detect_captions=detect_captions)
+        tables_result = [
+            table
+            for page_tables in _map_pages(pdf_bytes, process_page, _run_doc_batch, processes=True)
+            for table in page_tables
+        ]
 
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
-        detect_captions = data.get('detect_captions', True)
-        tables_result = []
+        return _json_response({
+            "success": True,
+            "tables": tables_result,
+            "table_count": len(tables_result)
+        })
 
-        # Caption patterns for medical papers
-        caption_patterns = [
-            r'^Table\s*\d+[\.:]\s*(.+)$',
-            r'^Tab\s*\d+[\.:]\s*(.+)$',
-            r'^TABLE\s*\d+[\.:]\s*(.+)$',
-        ]
+    except Exception as e:
+        return _json_response({"error": str(e)}, status=500)
 
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                page_text = page.extract_text() or ""
-                page_lines = page_text.split('\n')
-
-                # Find table captions on this page
-                captions = []
-                if detect_captions:
-                    for line in page_lines:
-                        for pattern in caption_patterns:
-                            match = re.match(pattern, line.strip(), re.IGNORECASE)
-                            if match:
-                                captions.append(line.strip())
-                                break
-
-                # Extract tables with settings for better structure
-                table_settings = {
-                    "vertical_strategy": "lines",
-                    "horizontal_strategy": "lines",
-                    "snap_tolerance": 3,
-                    "join_tolerance": 3,
-                }
 
-                page_tables = page.extract_tables(table_settings)
-
-                # Also try text-based extraction for tables without lines
-                if not page_tables:
-                    table_settings_text = {
-                        "vertical_strategy": "text",
-                        "horizontal_strategy": "text",
-                    }
-                    page_tables = page.extract_tables(table_settings_text)
-
-                for j, table in enumerate(page_tables):
-                    if table and len(table) > 0:
-                        # Clean None values and normalize
-                        cleaned_table = []
-                        for row in table:
-                            cleaned_row = []
-                            for cell in row:
-                                if cell:
-                                    # Clean whitespace and normalize
-                                    cleaned_cell = ' '.join(str(cell).split())
-                                else:
-                                    cleaned_cell = ""
-                                cleaned_row.append(cleaned_cell)
-                            cleaned_table.append(cleaned_row)
-
-                        # Determine headers (first non-empty row)
-                        headers = []
-                        data_rows = []
-                        for i, row in enumerate(cleaned_table):
-                            if any(cell.strip() for cell in row):
-                                if not headers:
-                                    headers = row
-                                else:
-                                    data_rows.append(row)
-
-                        # Match caption to table
-                        caption = ""
-                        if j < len(captions):
-                            caption = captions[j]
-
-                        tables_result.append({
-                            "page": page_num + 1,
-                            "table_index": j,
-                            "caption": caption,
-                            "headers": headers,
-                            "rows": data_rows,
-                            "raw": cleaned_table,
-                            "column_count": len(headers) if headers else 0,
-                            "row_count": len(cleaned_table)
-                        })
-
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "tables": tables_result,
-                "table_count": len(tables_result)
-            }),
-            mimetype="application/json"
-        )
+# Embedded image formats every browser can display without conversion
+BROWSER_IMAGE_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "jpg": "image/jpeg"}
 
-    except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
+
+# Figures uploaded for return_mode "gcs" live under this folder of the
+# caller's Storage prefix, and their signed URLs stay valid for this long
+FIGURE_UPLOAD_PREFIX = "figures"
+FIGURE_URL_TTL_SECONDS = 3600
+
+
+def _figure_uploader(pdf_bytes, uid):
+    """
+    Return upload(image_bytes, mime_type, name) -> signed URL, storing figures
+    in the project's default Storage bucket under uid's prefix and the PDF's
+    content hash.
+
+    Cloud Functions' default credentials carry a token but no private key, so
+    URLs are signed through the IAM signBlob API with the runtime service
+    account's access token.
+    """
+    from datetime import timedelta
+    from firebase_admin import storage
+    import google.auth
+    from google.auth.transport.requests import Request as AuthRequest
+
+    credentials, _ = google.auth.default()
+    credentials.refresh(AuthRequest())
+    bucket = storage.bucket()
+    prefix = f"{PDF_GCS_USER_PREFIX.format(uid=uid)}{FIGURE_UPLOAD_PREFIX}/{_pdf_key(pdf_bytes)}"
+
+    def upload(image_bytes, mime_type, name):
+        blob = bucket.blob(f"{prefix}/{name}.{mime_type.split('/')[1]}")
+        blob.upload_from_string(image_bytes, content_type=mime_type)
+        return blob.generate_signed_url(
+            expiration=timedelta(seconds=FIGURE_URL_TTL_SECONDS),
+            version="v4",
+            service_account_email=credentials.service_account_email,
+            access_token=credentials.token,
         )
 
+    return upload
+
+
+def _figures_enhanced_from_doc(doc, min_size=50, upload=None):
+    from PIL import Image
+
+    figures_result = []
+
+    for page_num in range(len(doc)):
+        page = doc[page_num]
+        page_text = page.get_text()
+
+        # Find figure captions
+        captions = []
+        for line in page_text.split('\n'):
+            line = line.strip()
+            if FIGURE_CAPTION_RE.match(line):
+                captions.append(line)
+
+        # Extract images, with each image's position on the page looked up by
+        # xref (get_image_info only reports xrefs when asked to)
+        image_list = page.get_images(full=True)
+        bbox_by_xref = {}
+        if image_list:
+            for item in page.get_image_info(xrefs=True):
+                bbox_by_xref.setdefault(item['xref'], item['bbox'])
+
+        for img_idx, img in enumerate(image_list):
+            # get_images(full=True) entries start (xref, smask, width, height, ...)
+            xref, _smask, width, height = img[:4]
+
+            # Skip small images (likely icons/logos) before extracting anything
+            if width < min_size or height < min_size:
+                continue
+
+            try:
+                base_image = doc.extract_image(xref)
+                image_bytes = base_image["image"]
+                ext = base_image.get("ext", "unknown")
+
+                # PNG and JPEG streams are sent as-is; anything else
+                # (JPX, JBIG2, raw pixel data) is converted to PNG
+                if ext in BROWSER_IMAGE_TYPES:
+                    mime_type = BROWSER_IMAGE_TYPES[ext]
+                else:
+                    img_byte_arr = io.BytesIO()
+                    Image.open(io.BytesIO(image_bytes)).save(img_byte_arr, format='PNG')
+                    image_bytes = img_byte_arr.getvalue()
+                    mime_type = "image/png"
+                bbox = bbox_by_xref.get(xref)
+
+                # Match caption to image based on proximity
+                caption = ""
+                if img_idx < len(captions):
+                    caption = captions[img_idx]
+
+                figure = {
+                    "page": page_num + 1,
+                    "figure_index": img_idx,
+                    "caption": caption,
+                    "bbox": list(bbox) if bbox else None,
+                    "width": width,
+                    "height": height,
+                    "format": ext,
+                    "mime_type": mime_type
+                }
+
+            except Exception as img_error:
+                # Skip images that can't be extracted or converted
+                continue
+
+            # Outside the try: a failed upload or signing is a request error,
+            # not a bad image to skip
+            if upload is not None:
+                figure["url"] = upload(image_bytes, mime_type, f"page{page_num + 1}_{img_idx}")
+            else:
+                figure["image_base64"] = base64.b64encode(image_bytes).decode('utf-8')
+            figures_result.append(figure)
+
+    return figures_result
+
 
 @https_fn.on_request(
     memory=options.MemoryOption.GB_1,
@@ -1001,124 +1666,100 @@ def extract_figures_enhanced(req: https_fn.Request) -> https_fn.Response:
     Enhanced figure extraction with caption detection.
     Extracts images and attempts to match them with nearby captions.
 
-    Request body: { "pdf_base64": "...", "min_size": 50, "dpi": 150 }
+    Request body: { "pdf_base64": "...", "min_size": 50, "return_mode": "base64" }
+        or multipart file upload. With "return_mode": "gcs" the images are
+        uploaded to the caller's prefix in Cloud Storage and each figure has
+        a signed "url" instead of "image_base64"; this needs an
+        "Authorization: Bearer <Firebase ID token>" header.
     Response: {
         "figures": [{
             "page": 1,
             "figure_index": 0,
             "caption": "Figure 1. CT scan showing...",
-            "image_base64": "...",
+            "image_base64": "...",  # or "url": "https://storage.googleapis.com/..."
+            "mime_type": "image/jpeg",  # PNG/JPEG as embedded, else PNG
             "bbox": [x0, y0, x1, y1],
             "width": N,
             "height": N
         }]
     }
     """
-    import re
-    import fitz
-
     try:
-        data = req.get_json()
-        if not data or 'pdf_base64' not in data:
-            return https_fn.Response(
-                json.dumps({"error": "pdf_base64 required"}),
-                status=400,
-                mimetype="application/json"
-            )
-
-        pdf_bytes = base64.b64decode(data['pdf_base64'])
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
         min_size = data.get('min_size', 50)
-        dpi = data.get('dpi', 150)
-
-        figures_result = []
-
-        # Caption patterns for figures
-        caption_patterns = [
-            r'^Figure\s*\d+[\.:]\s*(.+)',
-            r'^Fig\s*\.?\s*\d+[\.:]\s*(.+)',
-            r'^FIGURE\s*\d+[\.:]\s*(.+)',
-        ]
-
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        upload = None
+        if data.get('return_mode') == 'gcs':
+            uid = _request_uid(req)
+            if uid is None:
+                return _json_response({"error": "return_mode gcs requires a Firebase ID token"}, status=401)
+            upload = _figure_uploader(pdf_bytes, uid)
+
+        with _open_doc(pdf_bytes) as doc:
+            figures_result = _figures_enhanced_from_doc(doc, min_size, upload)
+
+        return _json_response({
+            "success": True,
+            "figures": figures_result,
+            "figure_count": len(figures_result)
+        })
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_text = page.get_text()
-
-            # Find figure captions
-            captions = []
-            for line in page_text.split('\n'):
-                for pattern in caption_patterns:
-                    match = re.match(pattern, line.strip(), re.IGNORECASE)
-                    if match:
-                        captions.append(line.strip())
-                        break
-
-            # Extract images
-            image_list = page.get_images(full=True)
-
-            for img_idx, img in enumerate(image_list):
-                xref = img[0]
-
-                try:
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-
-                    # Get image dimensions
-                    from PIL import Image
-                    pil_img = Image.open(io.BytesIO(image_bytes))
-                    width, height = pil_img.size
+    except Exception as e:
+        return _json_response({"error": str(e)}, status=500)
 
-                    # Skip small images (likely icons/logos)
-                    if width < min_size or height < min_size:
-                        continue
 
-                    # Convert to PNG
-                    img_byte_arr = io.BytesIO()
-                    pil_img.save(img_byte_arr, format='PNG')
-                    img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-
-                    # Try to get image position on page
-                    bbox = None
-                    for item in page.get_image_info():
-                        if item.get('xref') == xref:
-                            bbox = item.get('bbox')
-                            break
-
-                    # Match caption to image based on proximity
-                    caption = ""
-                    if img_idx < len(captions):
-                        caption = captions[img_idx]
-
-                    figures_result.append({
-                        "page": page_num + 1,
-                        "figure_index": img_idx,
-                        "caption": caption,
-                        "image_base64": img_base64,
-                        "bbox": list(bbox) if bbox else None,
-                        "width": width,
-                        "height": height,
-                        "format": base_image.get("ext", "unknown")
-                    })
+def _all_result(pdf_bytes, detect_captions=False, min_size=50):
+    # One parse of the PDF feeds every extractor
+    with _open_doc(pdf_bytes) as doc:
+        tables = _tables_enhanced_from_doc(doc, detect_captions)
+        figures = _figures_enhanced_from_doc(doc, min_size)
+        return {
+            "success": True,
+            "layout": _layout_from_doc(doc),
+            "positions": _positions_from_doc(doc),
+            "sections": _sections_from_doc(doc),
+            "tables": {"tables": tables, "table_count": len(tables)},
+            "figures": {"figures": figures, "figure_count": len(figures)}
+        }
 
-                except Exception as img_error:
-                    # Skip problematic images
-                    continue
 
-        doc.close()
+@https_fn.on_request(
+    memory=options.MemoryOption.GB_1,
+    timeout_sec=300,
+    cors=options.CorsOptions(cors_origins=get_cors_origins(), cors_methods=["POST", "OPTIONS"]),
+    invoker="public"
+)
+def extract_all(req: https_fn.Request) -> https_fn.Response:
+    """
+    Run every extractor over one parse of the PDF.
+    Replaces separate calls to extract_text_with_layout,
+    extract_text_with_positions, detect_sections, extract_tables_enhanced and
+    extract_figures_enhanced.
 
-        return https_fn.Response(
-            json.dumps({
-                "success": True,
-                "figures": figures_result,
-                "figure_count": len(figures_result)
-            }),
-            mimetype="application/json"
-        )
+    Request body: { "pdf_base64": "...", "detect_captions": false, "min_size": 50 }
+        or multipart file upload
+    Response: {
+        "layout": {...},     # as extract_text_with_layout
+        "positions": {...},  # as extract_text_with_positions
+        "sections": {...},   # as detect_sections
+        "tables": {...},     # as extract_tables_enhanced
+        "figures": {...}     # as extract_figures_enhanced
+    }
+    """
+    try:
+        pdf_bytes, data, error = _read_pdf_request(req)
+        if error:
+            return error
+        # Both end up in the cache key, so they must be plain hashable values
+        detect_captions = bool(data.get('detect_captions', False))
+        try:
+            min_size = int(data.get('min_size', 50))
+        except (TypeError, ValueError):
+            return _json_response({"error": "min_size must be an integer"}, status=400)
+        result = _cached(_all_result, pdf_bytes, detect_captions, min_size)
+
+        return _json_response(result)
 
     except Exception as e:
-        return https_fn.Response(
-            json.dumps({"error": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
+        return _json_response({"error": str(e)}, status=500)
@@ -141,7 +141,8 @@ def test_capture_highlights(pdf_base64: str, highlights_data: list):
             print(f"  Text: \"{shot['text'][:50]}...\"")
 
             # Save screenshot to file
-            output_path = f"screenshot_{i+1}_{shot['label'].replace(' ', '_')}.png"
+            ext = shot.get('mime_type', 'image/png').split('/')[1]
+            output_path = f"screenshot_{i+1}_{shot['label'].replace(' ', '_')}.{ext}"
             with open(output_path, 'wb') as f:
                 f.write(base64.b64decode(shot['image_base64']))
             print(f"  Saved to: {output_path}")
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Record a signed-in browser session for the Playwright tests.
+
+Opens the app, waits for you to sign in with Google by hand, then saves the
+context's cookies, localStorage and IndexedDB (where Firebase Auth keeps its
+session) to auth.json. Tests that use the signed_in_page fixture start from
+that state instead of waiting on a manual sign-in.
+
+Usage:
+    python record_auth.py [app_url]
+"""
+
+import sys
+
+from playwright.sync_api import sync_playwright
+
+from _testutil import AUTH_STATE
+
+APP_URL = "http://127.0.0.1:5002"
+
+
+def record_auth(app_url=APP_URL):
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=False)
+        context = browser.new_context()
+        page = context.new_page()
+
+        page.goto(app_url, wait_until="domcontentloaded")
+        print("Sign in with Google in the browser window (waiting up to 5 minutes)...")
+        page.wait_for_selector('button:has-text("Sign Out")', timeout=300000)
+
+        context.storage_state(path=AUTH_STATE, indexed_db=True)
+        print(f"✅ Saved signed-in state to {AUTH_STATE}")
+        browser.close()
+
+
+if __name__ == "__main__":
+    record_auth(*sys.argv[1:2])
@@ -3,137 +3,124 @@
 Test AI extraction functionality to diagnose issues
 """
 
-from playwright.sync_api import sync_playwright
+import sys
 import time
 
-def test_ai_extraction():
-    """Test AI extraction with console logging"""
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=False,
-            slow_mo=500
-        )
-        context = browser.new_context()
-        page = context.new_page()
+import pytest
 
-        # Capture console messages
-        console_logs = []
-        def log_console(msg):
-            log_entry = f"[{msg.type}] {msg.text}"
-            console_logs.append(log_entry)
-            print(f"  📝 {log_entry}")
+from _testutil import attach_listeners, keep_open
 
-        page.on("console", log_console)
+def test_ai_extraction(signed_in_page, app_url):
+    """Test AI extraction with console logging"""
+    page = signed_in_page
 
-        # Capture errors
-        errors = []
-        def log_error(error):
-            errors.append(str(error))
-            print(f"  ❌ {error}")
+    # Capture console messages and errors
+    console_logs, errors = attach_listeners(page, errors_only=False)
 
-        page.on("pageerror", log_error)
+    # Screenshots are kept in memory as JPEG and only written out on failure
+    screenshots = []
+    def snap(label):
+        screenshots.append((label, page.screenshot(type='jpeg', quality=70)))
 
-        try:
-            print("\n🌐 Navigating to app...")
-            cache_buster = int(time.time())
-            page.goto(f'http://127.0.0.1:5002?_={cache_buster}', wait_until='networkidle')
-            time.sleep(3)
+    try:
+        print("\n🌐 Navigating to app...")
+        cache_buster = int(time.time())
+        page.goto(f'{app_url}?_={cache_buster}', wait_until='domcontentloaded')
+        page.wait_for_selector('button:has-text("Sign in with Google"), button:has-text("Sign Out")', timeout=10000)
 
-            print("\n📸 Taking initial screenshot...")
-            page.screenshot(path='ai_test_01_initial.png')
+        print("\n📸 Taking initial screenshot...")
+        snap('01_initial')
 
-            # Check if signed in
-            try:
-                page.wait_for_selector('button:has-text("Sign Out")', timeout=3000)
-                print("✅ Already signed in")
-            except:
-                print("⚠️ Not signed in - trying to sign in first...")
-                try:
-                    signin_button = page.locator('button:has-text("Sign in with Google")').first
-                    if signin_button.is_visible():
-                        print("  Clicking Sign In button...")
-                        signin_button.click()
-                        time.sleep(10)  # Wait for manual sign-in
-                        page.screenshot(path='ai_test_02_after_signin.png')
-                except Exception as e:
-                    print(f"  Sign in failed: {e}")
-
-            # Look for AI extraction UI elements
-            print("\n🔍 Looking for AI extraction features...")
-
-            # Check for AI fill button
+        # Check if signed in
+        try:
+            page.wait_for_selector('button:has-text("Sign Out")', timeout=3000)
+            print("✅ Already signed in")
+        except:
+            print("⚠️ Not signed in - trying to sign in first...")
             try:
-                ai_buttons = page.locator('button:has-text("AI Fill")').all()
-                print(f"  Found {len(ai_buttons)} 'AI Fill' buttons")
-
-                if len(ai_buttons) > 0:
-                    print(f"  ✅ AI Fill buttons found!")
-                    # Try clicking the first one
-                    print("  🖱️ Clicking first AI Fill button...")
-                    ai_buttons[0].click()
-                    time.sleep(2)
-                    page.screenshot(path='ai_test_03_after_ai_click.png')
-                else:
-                    print("  ⚠️ No AI Fill buttons found")
+                signin_button = page.locator('button:has-text("Sign in with Google")').first
+                if signin_button.is_visible():
+                    print("  Clicking Sign In button...")
+                    signin_button.click()
+                    time.sleep(10)  # Wait for manual sign-in (run record_auth.py once to skip this)
+                    snap('02_after_signin')
             except Exception as e:
-                print(f"  ❌ Error checking AI buttons: {e}")
-
-            # Check for Gemini API key
-            print("\n🔑 Checking for API key...")
-            api_key_check = page.evaluate("""
-                () => {
-                    const apiKey = typeof apiKey !== 'undefined' ? apiKey : 'NOT_FOUND';
-                    return {
-                        apiKey: apiKey ? apiKey.substring(0, 10) + '...' : 'undefined',
-                        hasGemini: typeof genAI !== 'undefined'
-                    };
-                }
-            """)
-            print(f"  API Key: {api_key_check['apiKey']}")
-            print(f"  Gemini SDK loaded: {api_key_check['hasGemini']}")
-
-            # Look for any error messages in the UI
-            print("\n🔍 Checking for error messages in UI...")
-            try:
-                error_elements = page.locator('[class*="error"], [class*="toast"]').all()
-                for elem in error_elements:
-                    if elem.is_visible():
-                        text = elem.text_content()
-                        if text and text.strip():
-                            print(f"  Found UI message: {text}")
-            except:
-                pass
-
-            print("\n📊 Final state:")
-            print(f"  Console logs: {len(console_logs)}")
-            print(f"  Errors: {len(errors)}")
-
-            if console_logs:
-                print("\n  Last 10 console logs:")
-                for log in console_logs[-10:]:
-                    print(f"    {log}")
-
-            if errors:
-                print("\n  JavaScript Errors:")
-                for err in errors:
-                    print(f"    {err}")
-
-            print("\n⏳ Keeping browser open for 15 seconds for inspection...")
-            time.sleep(15)
+                print(f"  Sign in failed: {e}")
 
+        # Look for AI extraction UI elements
+        print("\n🔍 Looking for AI extraction features...")
+
+        # Probe the AI Fill buttons and the Gemini setup in one round trip
+        state = page.evaluate("""() => ({
+            aiButtons: [...document.querySelectorAll('button')]
+                .filter(b => b.textContent.includes('AI Fill')).length,
+            apiKey: (typeof apiKey !== 'undefined' && apiKey) ? apiKey.slice(0, 10) + '...' : 'undefined',
+            hasGemini: typeof genAI !== 'undefined'
+        })""")
+
+        # Check for AI fill button
+        try:
+            print(f"  Found {state['aiButtons']} 'AI Fill' buttons")
+
+            if state['aiButtons'] > 0:
+                print(f"  ✅ AI Fill buttons found!")
+                # Try clicking the first one
+                print("  🖱️ Clicking first AI Fill button...")
+                page.locator('button:has-text("AI Fill")').first.click()
+                time.sleep(2)
+                snap('03_after_ai_click')
+            else:
+                print("  ⚠️ No AI Fill buttons found")
         except Exception as e:
-            print(f"\n💥 Test failed: {e}")
-            page.screenshot(path='ai_test_error.png')
-            raise
-        finally:
-            print("\n🏁 Closing browser...")
-            browser.close()
+            print(f"  ❌ Error checking AI buttons: {e}")
+
+        # Check for Gemini API key
+        print("\n🔑 Checking for API key...")
+        print(f"  API Key: {state['apiKey']}")
+        print(f"  Gemini SDK loaded: {state['hasGemini']}")
+
+        # Look for any error messages in the UI
+        print("\n🔍 Checking for error messages in UI...")
+        try:
+            # Filter to visible, non-empty messages inside the page in one call
+            messages = page.locator('[class*="error"], [class*="toast"]').evaluate_all(
+                "els => els.filter(e => e.offsetParent !== null)"
+                ".map(e => (e.textContent || '').trim()).filter(Boolean)"
+            )
+            for message in messages:
+                print(f"  Found UI message: {message}")
+        except:
+            pass
+
+        print("\n📊 Final state:")
+        print(f"  Console logs: {len(console_logs)}")
+        print(f"  Errors: {len(errors)}")
+
+        if console_logs:
+            print("\n  Last 10 console logs:")
+            for log in list(console_logs)[-10:]:
+                print(f"    {log}")
+
+        if errors:
+            print("\n  JavaScript Errors:")
+            for err in errors:
+                print(f"    {err}")
+
+        keep_open(15, page)
+
+    except Exception as e:
+        print(f"\n💥 Test failed: {e}")
+        snap('error')
+        for label, buf in screenshots:
+            with open(f'ai_test_{label}.jpg', 'wb') as f:
+                f.write(buf)
+        raise
 
 
 if __name__ == '__main__':
     print("\n" + "="*70)
     print("  AI Extraction Debug Test")
     print("="*70)
-    test_ai_extraction()
-    print("\n✅ Test complete! Check ai_test_*.png screenshots")
+    exit_code = pytest.main([__file__, "-s"])
+    print("\n✅ Test complete! Screenshots (ai_test_*.jpg) are saved on failure")
+    sys.exit(exit_code)
@@ -1,96 +1,90 @@
 #!/usr/bin/env python3
 """Test the deployed Cloud Functions"""
 
-import time
-from playwright.sync_api import sync_playwright
-
-APP_URL = "http://127.0.0.1:5002"
-
-def test_tables_and_figures():
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False, slow_mo=300)
-        page = browser.new_page()
-
-        # Capture console messages
-        errors = []
-        page.on("console", lambda msg: errors.append(msg.text) if "error" in msg.type.lower() else print(f"[{msg.type}] {msg.text[:150]}"))
-
-        print("1. Loading app...")
-        page.goto(APP_URL, wait_until="networkidle")
-        time.sleep(2)
-
-        print("2. Checking for PDF dropdown...")
-        dropdown = page.locator("select")
-        if dropdown.count() > 0:
-            options = dropdown.first.locator("option")
-            print(f"   Found dropdown with {options.count()} options")
-
-            # Select first PDF
-            if options.count() > 1:
-                dropdown.first.select_option(index=1)
-                print("   Selected first PDF, waiting for load...")
-                time.sleep(5)
-
-                canvas = page.locator("canvas")
-                if canvas.count() > 0:
-                    print(f"   ✓ PDF loaded ({canvas.count()} canvases)")
-
-                    # Test Tables Tab
-                    print("3. Testing Tables extraction...")
-                    tabs = page.locator("button")
-                    for i in range(tabs.count()):
-                        if "Tables" in (tabs.nth(i).text_content() or ""):
-                            tabs.nth(i).click()
-                            break
-                    time.sleep(1)
-
-                    extract_tables_btn = page.locator("button:has-text('Extract Tables')")
-                    if extract_tables_btn.count() > 0:
-                        print("   Clicking Extract Tables...")
-                        extract_tables_btn.first.click()
-                        time.sleep(10)
-
-                        # Check for results
-                        table_results = page.locator("text=Found")
-                        if table_results.count() > 0:
-                            print(f"   ✓ Table extraction result: {table_results.first.text_content()}")
-                        else:
-                            print("   ✗ No tables found or extraction failed")
-
-                    # Test Figures Tab
-                    print("4. Testing Figures extraction...")
-                    for i in range(tabs.count()):
-                        if "Figures" in (tabs.nth(i).text_content() or ""):
-                            tabs.nth(i).click()
-                            break
-                    time.sleep(1)
-
-                    extract_figures_btn = page.locator("button:has-text('Extract Figures')")
-                    if extract_figures_btn.count() > 0:
-                        print("   Clicking Extract Figures...")
-                        extract_figures_btn.first.click()
-                        time.sleep(10)
-
-                        # Check for results
-                        figure_results = page.locator("text=Found")
-                        if figure_results.count() > 0:
-                            print(f"   ✓ Figure extraction result: {figure_results.first.text_content()}")
-                        else:
-                            print("   ✗ No figures found or extraction failed")
-
-                else:
-                    print("   ✗ PDF did not load")
-        else:
-            print("   No dropdown found")
-
-        if errors:
-            print(f"\nConsole errors: {len(errors)}")
-            for e in errors[:5]:
-                print(f"   - {e[:100]}")
-
-        print("\nBrowser open for 20s for inspection...")
-        time.sleep(20)
-        browser.close()
+import re
+import sys
+
+import pytest
+from playwright.sync_api import expect
+
+from _testutil import attach_listeners, keep_open, wait_for_canvas
+
+
+@pytest.mark.no_images
+def test_tables_and_figures(page, app_url):
+    # Capture console messages
+    _, errors = attach_listeners(page, errors_only=False)
+
+    # Bind the locators once; both extraction blocks reuse them
+    dropdown = page.locator("select")
+    canvas = page.locator("canvas")
+    tables_tab = page.get_by_role("button", name="Tables", exact=True)
+    figures_tab = page.get_by_role("button", name="Figures", exact=True)
+    extract_tables_btn = page.locator("button:has-text('Extract Tables')")
+    extract_figures_btn = page.locator("button:has-text('Extract Figures')")
+    result_message = page.locator("text=/Found \\d+/")
+
+    print("1. Loading app...")
+    page.goto(app_url, wait_until="domcontentloaded")
+    page.wait_for_selector("select", state="attached", timeout=10000)
+
+    print("2. Checking for PDF dropdown...")
+    if dropdown.count() > 0:
+        option_count = dropdown.first.locator("option").count()
+        print(f"   Found dropdown with {option_count} options")
+
+        # Select first PDF
+        if option_count > 1:
+            dropdown.first.select_option(index=1)
+            print("   Selected first PDF, waiting for load...")
+            if wait_for_canvas(canvas):
+                print(f"   ✓ PDF loaded ({canvas.count()} canvases)")
+
+                # Test Tables Tab
+                print("3. Testing Tables extraction...")
+                if tables_tab.count() > 0:
+                    tables_tab.first.click()
+                    expect(tables_tab.first).to_have_class(re.compile(r"\bactive\b"), timeout=2000)
+
+                if extract_tables_btn.count() > 0:
+                    print("   Clicking Extract Tables...")
+                    extract_tables_btn.first.click()
+
+                    # Wait for the result message as soon as it renders
+                    try:
+                        expect(result_message.first).to_be_visible(timeout=20000)
+                        print(f"   ✓ Table extraction result: {result_message.first.text_content()}")
+                    except AssertionError:
+                        print("   ✗ No tables found or extraction failed")
+
+                # Test Figures Tab
+                print("4. Testing Figures extraction...")
+                if figures_tab.count() > 0:
+                    figures_tab.first.click()
+                    expect(figures_tab.first).to_have_class(re.compile(r"\bactive\b"), timeout=2000)
+
+                if extract_figures_btn.count() > 0:
+                    print("   Clicking Extract Figures...")
+                    extract_figures_btn.first.click()
+
+                    # Wait for the result message as soon as it renders
+                    try:
+                        expect(result_message.first).to_be_visible(timeout=20000)
+                        print(f"   ✓ Figure extraction result: {result_message.first.text_content()}")
+                    except AssertionError:
+                        print("   ✗ No figures found or extraction failed")
+
+            else:
+                print("   ✗ PDF did not load")
+    else:
+        print("   No dropdown found")
+
+    if errors:
+        print(f"\nConsole errors: {len(errors)}")
+        for e in list(errors)[:5]:
+            print(f"   - {e[:100]}")
+
+    keep_open(20, page)
 
 if __name__ == "__main__":
-    test_tables_and_figures()
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -2,55 +2,45 @@
 """Quick test to capture console errors when loading a PDF"""
 
 import os
-import time
-from playwright.sync_api import sync_playwright
+import sys
 
-TEST_PDF = os.path.expanduser("~/Downloads/Kim-2016.pdf")
-APP_URL = "http://127.0.0.1:5002"
-
-def test_with_console():
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False, slow_mo=300)
-        page = browser.new_page()
+import pytest
 
-        # Capture console messages
-        console_messages = []
-        def handle_console(msg):
-            console_messages.append(f"[{msg.type}] {msg.text}")
-            if msg.type == "error":
-                print(f"❌ CONSOLE ERROR: {msg.text}")
+from _testutil import attach_listeners, keep_open, pdf_payload, wait_for_pdf
 
-        page.on("console", handle_console)
+TEST_PDF = os.path.expanduser("~/Downloads/Kim-2016.pdf")
 
-        # Capture page errors
-        def handle_error(error):
-            print(f"💥 PAGE ERROR: {error}")
+@pytest.mark.no_images
+def test_with_console(page, app_url):
+    # Capture console messages and page errors, reported at the end
+    console_messages, errors = attach_listeners(page, errors_only=False, sink=None)
 
-        page.on("pageerror", handle_error)
+    print("Loading app...")
+    page.goto(app_url, wait_until="domcontentloaded")
+    page.wait_for_selector("input[type='file']", timeout=10000)
 
-        print("Loading app...")
-        page.goto(APP_URL)
-        time.sleep(3)
+    print("Looking for file input...")
+    file_input = page.locator("input[type='file']").first
 
-        print("Looking for file input...")
-        file_input = page.locator("input[type='file']").first
+    print(f"Uploading PDF: {TEST_PDF}")
+    try:
+        file_input.set_input_files(pdf_payload(TEST_PDF))
+        print("File input set, waiting for processing...")
+        wait_for_pdf(page)
+    except Exception as e:
+        print(f"Error during upload: {e}")
 
-        print(f"Uploading PDF: {TEST_PDF}")
-        try:
-            file_input.set_input_files(TEST_PDF)
-            print("File input set, waiting for processing...")
-            time.sleep(10)
-        except Exception as e:
-            print(f"Error during upload: {e}")
+    print("\n--- Console Messages ---")
+    for msg in list(console_messages)[-20:]:
+        print(msg)
 
-        print("\n--- Console Messages ---")
-        for msg in console_messages[-20:]:
-            print(msg)
+    if errors:
+        print("\n--- Errors ---")
+        for err in errors:
+            print(f"❌ {err}")
 
-        print("\nBrowser open for inspection (30s)...")
-        time.sleep(30)
+    keep_open(30, page)
 
-        browser.close()
 
 if __name__ == "__main__":
-    test_with_console()
+    sys.exit(pytest.main([__file__, "-s"]))
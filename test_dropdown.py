@@ -1,80 +1,73 @@
 #!/usr/bin/env python3
 """Test PDF dropdown and citation jump"""
 
+import sys
 import time
-from playwright.sync_api import sync_playwright
 
-APP_URL = "http://127.0.0.1:5002"
+import pytest
 
-def test_dropdown():
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False, slow_mo=300)
-        page = browser.new_page()
+from _testutil import attach_listeners, keep_open, wait_for_canvas
 
-        # Capture console
-        page.on("console", lambda msg: print(f"[{msg.type}] {msg.text[:150]}") if "error" in msg.type.lower() else None)
 
-        print("1. Loading app...")
-        page.goto(APP_URL, wait_until="networkidle")
-        time.sleep(3)
+def test_dropdown(page, app_url):
+    # Capture console
+    attach_listeners(page)
 
-        print("2. Checking for PDF dropdown...")
-        dropdown = page.locator("select")
-        if dropdown.count() > 0:
-            options = dropdown.first.locator("option")
-            print(f"   Found dropdown with {options.count()} options")
-            for i in range(min(5, options.count())):
-                text = options.nth(i).text_content()
-                print(f"   - Option {i}: {text}")
+    print("1. Loading app...")
+    page.goto(app_url, wait_until="domcontentloaded")
+    page.wait_for_selector("select", state="attached", timeout=10000)
 
-            print("3. Selecting first PDF...")
-            if options.count() > 1:
-                dropdown.first.select_option(index=1)  # Select first actual PDF (index 0 is placeholder)
-                print("   Waiting for PDF to load...")
-                time.sleep(5)
+    print("2. Checking for PDF dropdown...")
+    dropdown = page.locator("select")
+    if dropdown.count() > 0:
+        option_texts = dropdown.first.locator("option").all_text_contents()
+        print(f"   Found dropdown with {len(option_texts)} options")
+        for i, text in enumerate(option_texts[:5]):
+            print(f"   - Option {i}: {text}")
 
-                canvas = page.locator("canvas")
-                if canvas.count() > 0:
-                    print(f"   ✓ PDF loaded ({canvas.count()} canvases)")
+        print("3. Selecting first PDF...")
+        if len(option_texts) > 1:
+            dropdown.first.select_option(index=1)  # Select first actual PDF (index 0 is placeholder)
+            print("   Waiting for PDF to load...")
+            canvas = page.locator("canvas")
+            if wait_for_canvas(canvas):
+                print(f"   ✓ PDF loaded ({canvas.count()} canvases)")
 
-                    print("4. Testing citation jump directly...")
-                    # Get some text from PDF to search for
-                    pdf_text = page.evaluate("""async () => {
-                        if (!window.pdfDoc) return null;
-                        const page = await window.pdfDoc.getPage(1);
-                        const textContent = await page.getTextContent();
-                        const text = textContent.items.map(item => item.str).join(' ');
-                        return text.substring(0, 500);
-                    }""")
-                    if pdf_text:
-                        print(f"   PDF text (first 200): {pdf_text[:200]}")
+                print("4. Testing citation jump directly...")
+                # Pick candidate words to search for straight from page 1's text
+                words = page.evaluate("""async () => {
+                    if (!window.pdfDoc) return null;
+                    const page = await window.pdfDoc.getPage(1);
+                    const textContent = await page.getTextContent();
+                    return textContent.items
+                        .flatMap(item => item.str.split(/\\s+/))
+                        .filter(w => w.length > 4)
+                        .slice(0, 5);
+                }""")
+                if words:
+                    print(f"   Candidate words: {words}")
+                    search_word = words[0]
+                    print(f"   Searching for: '{search_word}'")
 
-                        # Find a word to search
-                        words = [w for w in pdf_text.split() if len(w) > 4][:5]
-                        if words:
-                            search_word = words[0]
-                            print(f"   Searching for: '{search_word}'")
+                    # Pass the word as an argument rather than splicing it into the script
+                    result = page.evaluate("""(word) => {
+                        if (window.jumpToCitation) {
+                            window.jumpToCitation(word, 'Test');
+                            return 'called';
+                        }
+                        return 'not available';
+                    }""", search_word)
+                    print(f"   jumpToCitation result: {result}")
+                    time.sleep(2)
 
-                            result = page.evaluate(f"""() => {{
-                                if (window.jumpToCitation) {{
-                                    window.jumpToCitation('{search_word}', 'Test');
-                                    return 'called';
-                                }}
-                                return 'not available';
-                            }}""")
-                            print(f"   jumpToCitation result: {result}")
-                            time.sleep(2)
+                    highlights = page.locator(".citation-jump-highlight")
+                    print(f"   Highlights created: {highlights.count()}")
+            else:
+                print("   ✗ PDF did not load")
+    else:
+        print("   No dropdown found - check if pdfs.json is accessible")
 
-                            highlights = page.locator(".citation-jump-highlight")
-                            print(f"   Highlights created: {highlights.count()}")
-                else:
-                    print("   ✗ PDF did not load")
-        else:
-            print("   No dropdown found - check if pdfs.json is accessible")
-
-        print("\nBrowser open for 20s...")
-        time.sleep(20)
-        browser.close()
+    keep_open(20, page)
 
 if __name__ == "__main__":
-    test_dropdown()
+    sys.exit(pytest.main([__file__, "-s"]))
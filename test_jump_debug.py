@@ -1,48 +1,44 @@
 #!/usr/bin/env python3
 """Test citation jump with console debug output"""
 
+import re
+import sys
 import time
-from playwright.sync_api import sync_playwright
 
-APP_URL = "http://127.0.0.1:5002"
+import pytest
 
-def test_jump():
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False, slow_mo=200)
-        page = browser.new_page()
+from _testutil import attach_listeners, keep_open, wait_for_app
 
-        # Capture ALL console messages
-        def handle_console(msg):
-            if 'jumpToCitation' in msg.text or 'error' in msg.type.lower():
-                print(f"[CONSOLE {msg.type}] {msg.text[:300]}")
+JUMP_LOG_RE = re.compile(r"jumpToCitation|error", re.I)
 
-        page.on("console", handle_console)
 
-        print("1. Loading app...")
-        page.goto(APP_URL, wait_until="networkidle")
-        time.sleep(3)
+def test_jump(page, app_url):
+    # Show errors plus jumpToCitation's own debug output
+    attach_listeners(page, pattern=JUMP_LOG_RE, sink=lambda line: print(f"[CONSOLE] {line[:300]}"))
 
-        print("2. Selecting PDF from dropdown...")
-        dropdown = page.locator("select").first
-        dropdown.select_option(index=1)
-        time.sleep(5)
+    print("1. Loading app...")
+    page.goto(app_url, wait_until="domcontentloaded")
+    wait_for_app(page)
 
-        print("3. Calling jumpToCitation...")
-        # Call jumpToCitation with a word that should be in the PDF
-        page.evaluate("""() => {
-            if (window.jumpToCitation) {
-                window.jumpToCitation('patients', 'Test Search');
-            }
-        }""")
-        time.sleep(3)
+    print("2. Selecting PDF from dropdown...")
+    dropdown = page.locator("select").first
+    dropdown.select_option(index=1)
+    time.sleep(5)
 
-        print("4. Checking highlights...")
-        highlights = page.locator(".citation-jump-highlight")
-        print(f"   Highlights: {highlights.count()}")
+    print("3. Calling jumpToCitation...")
+    # Call jumpToCitation with a word that should be in the PDF
+    page.evaluate("""() => {
+        if (window.jumpToCitation) {
+            window.jumpToCitation('patients', 'Test Search');
+        }
+    }""")
+    time.sleep(3)
 
-        print("\nBrowser open for 15s...")
-        time.sleep(15)
-        browser.close()
+    print("4. Checking highlights...")
+    highlights = page.locator(".citation-jump-highlight")
+    print(f"   Highlights: {highlights.count()}")
+
+    keep_open(15, page)
 
 if __name__ == "__main__":
-    test_jump()
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -2,17 +2,19 @@
 """Test with browser cache disabled"""
 
 import os
-import time
-from playwright.sync_api import sync_playwright
+import sys
+
+import pytest
+
+from _testutil import dom_counts, keep_open, pdf_payload, wait_for_canvas
 
 TEST_PDF = os.path.expanduser("~/Downloads/111099 english.pdf")
-APP_URL = "http://127.0.0.1:5002"
 
-def test_nocache():
-    with sync_playwright() as p:
-        # Launch with cache disabled
-        browser = p.chromium.launch(headless=False, args=['--disable-cache'])
-        context = browser.new_context(bypass_csp=True)
+def test_nocache(browser, app_url):
+    # Ask the server for fresh copies of every asset, not just the page; this
+    # needs its own context rather than the shared page fixture's
+    context = browser.new_context(bypass_csp=True, extra_http_headers={"Cache-Control": "no-cache"})
+    try:
         page = context.new_page()
 
         console_errors = []
@@ -24,18 +26,18 @@ def test_nocache():
         page.on("console", handle_console)
 
         print("Loading app (cache disabled)...")
-        page.goto(APP_URL, wait_until="networkidle")
+        page.goto(app_url, wait_until="networkidle")
 
         # Hard refresh
-        page.evaluate("() => location.reload(true)")
-        time.sleep(3)
+        page.reload(wait_until="networkidle")
 
         print("Uploading PDF...")
         file_input = page.locator("input[type='file']").first
-        file_input.set_input_files(TEST_PDF)
+        file_input.set_input_files(pdf_payload(TEST_PDF))
 
-        print("Waiting 10s for PDF to load...")
-        time.sleep(10)
+        print("Waiting for PDF to load...")
+        canvas = page.locator("canvas")
+        wait_for_canvas(canvas, timeout=15000)
 
         if console_errors:
             print(f"\n❌ Found {len(console_errors)} console errors!")
@@ -45,16 +47,15 @@ def test_nocache():
             print("\n✅ No console errors!")
 
         # Check if PDF canvas is visible
-        canvas = page.locator("canvas")
-        if canvas.count() > 0:
-            print(f"✅ PDF rendered ({canvas.count()} canvases)")
+        canvas_count = dom_counts(page, {"canvas": "canvas"})["canvas"]
+        if canvas_count > 0:
+            print(f"✅ PDF rendered ({canvas_count} canvases)")
         else:
             print("❌ PDF did not render")
 
-        print("\nBrowser open for 20s...")
-        time.sleep(20)
-
-        browser.close()
+        keep_open(20, page)
+    finally:
+        context.close()
 
 if __name__ == "__main__":
-    test_nocache()
+    sys.exit(pytest.main([__file__, "-s"]))
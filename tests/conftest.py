@@ -0,0 +1,22 @@
+"""Pytest hooks for the integration tests in this directory."""
+
+import os
+import sys
+
+import pytest
+
+# Let the tests here share the browser settings in the repo root's _testutil
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    # Screenshot a failing test's page while it is still open; passing tests
+    # take no screenshots at all
+    outcome = yield
+    report = outcome.get_result()
+    page = getattr(item.instance, "page", None)
+    if report.when == "call" and report.failed and page is not None:
+        directory = getattr(item.module, "SCREENSHOT_DIR", "test_screenshots")
+        os.makedirs(directory, exist_ok=True)
+        page.screenshot(path=os.path.join(directory, f"{item.name}.png"))
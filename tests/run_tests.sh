@@ -8,7 +8,8 @@ echo "=============================================="
 echo ""
 echo "Prerequisites:"
 echo "  1. Firebase emulators running: firebase emulators:start"
-echo "  2. Python dependencies: pip install playwright requests"
+echo "  2. Python dependencies: pip install playwright pytest pytest-xdist requests"
+echo "     (optional, faster base64: pip install pybase64)"
 echo "  3. Playwright browsers: playwright install chromium"
 echo ""
 
@@ -27,10 +28,10 @@ python tests/test_html_report.py
 
 echo ""
 echo "Testing UI Integration..."
-python tests/test_extraction_integration.py
+python -m pytest -s -n auto tests/test_extraction_integration.py
 
 echo ""
 echo "=============================================="
 echo "  All tests complete!"
-echo "  Check test_screenshots/ for screenshots"
+echo "  Failing UI tests leave a screenshot in test_screenshots/<worker>/"
 echo "=============================================="
@@ -7,26 +7,73 @@ Tests:
 2. Figure extraction workflow
 3. Highlight persistence across sessions
 4. UI interaction workflows
+
+The tests are independent, so pytest-xdist can spread them over workers:
+
+    pytest -n auto tests/test_extraction_integration.py
+
+Each worker process launches its own browser and context once and gives
+every test a new page in it; localStorage, sessionStorage and cookies are
+cleared between tests, while the HTTP cache is kept. All workers talk to the same app (APP_URL, default
+the hosting emulator on 5002).
 """
 
-from playwright.sync_api import sync_playwright, expect
-import time
+from playwright.sync_api import sync_playwright, expect, TimeoutError as PlaywrightTimeoutError
 import json
+import logging
+import logging.handlers
 import os
+import sys
+
+import pytest
+
+from _testutil import HEADLESS, LAUNCH_ARGS, SLOW_MO
+
+# Progress goes through logging: LOG_LEVEL=WARNING keeps only the problems,
+# and the memory handler writes in batches instead of once per line
+log = logging.getLogger("cerebellar.tests")
+log.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+log.addHandler(logging.handlers.MemoryHandler(
+    capacity=1000, flushLevel=logging.ERROR, target=logging.StreamHandler(sys.stdout)
+))
 
 # Configuration
-BASE_URL = "http://127.0.0.1:5002"
+BASE_URL = os.environ.get("APP_URL", "http://127.0.0.1:5002")
 TEST_PDF = "Kim2016.pdf"  # Ensure this exists in public/pdf/
+PDF_DROPDOWN = '.pdf-header select'
+# gw0, gw1, ... under xdist; keeps parallel workers' failure screenshots apart
+# (taken by the hook in tests/conftest.py)
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+SCREENSHOT_DIR = os.path.join("test_screenshots", WORKER_ID)
+# Panel tabs by their data-tab attribute (the Form tab's key is "extract")
+TAB_LOCATORS = {
+    'Form': 'button[data-tab="extract"]',
+    'Tables': 'button[data-tab="tables"]',
+    'Figures': 'button[data-tab="figures"]',
+    'Chat': 'button[data-tab="chat"]',
+}
 
 
 class TestExtractionIntegration:
     """Integration tests for extraction features"""
 
+    @classmethod
+    def setup_class(cls):
+        """Start Playwright, one browser and one context shared by every test in the class"""
+        cls.playwright = sync_playwright().start()
+        cls.browser = cls.playwright.chromium.launch(headless=HEADLESS, slow_mo=SLOW_MO, args=LAUNCH_ARGS)
+        # Kept across tests so the app's JS/CSS stays in the HTTP cache
+        cls.context = cls.browser.new_context()
+
+    @classmethod
+    def teardown_class(cls):
+        """Close the shared browser once all tests have run"""
+        cls.context.close()
+        cls.browser.close()
+        cls.playwright.stop()
+
     def setup_method(self):
-        """Setup for each test"""
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=False, slow_mo=300)
-        self.context = self.browser.new_context()
+        """Setup for each test: a new page in the shared context"""
         self.page = self.context.new_page()
 
         # Capture console logs
@@ -38,286 +85,219 @@ class TestExtractionIntegration:
         self.page.on("pageerror", lambda error: self.errors.append(str(error)))
 
     def teardown_method(self):
-        """Cleanup after each test"""
-        self.browser.close()
-        self.playwright.stop()
+        """Clear app state so the next test starts fresh, then close the page"""
+        if self.page.url.startswith(BASE_URL):
+            self.page.evaluate("() => { localStorage.clear(); sessionStorage.clear(); }")
+        self.context.clear_cookies()
+        self.page.close()
+
+    def switch_tab(self, tab_name):
+        """Click a panel tab and wait until the app marks it active"""
+        self.page.click(TAB_LOCATORS[tab_name])
+        self.page.wait_for_selector(f'{TAB_LOCATORS[tab_name]}.active', timeout=2000)
 
     def navigate_to_app(self):
-        """Navigate to the app with cache busting"""
-        cache_buster = int(time.time())
-        self.page.goto(f'{BASE_URL}?_={cache_buster}', wait_until='networkidle')
-        time.sleep(2)
+        """Navigate to the app"""
+        self.page.goto(BASE_URL, wait_until='networkidle')
+        # React has mounted once #root has children
+        self.page.wait_for_function("() => document.querySelector('#root')?.children.length > 0")
 
     def load_test_pdf(self):
         """Load the test PDF from the dropdown"""
-        # Wait for available PDFs dropdown
         try:
-            dropdown = self.page.wait_for_selector('select', timeout=5000)
-            if dropdown:
-                # Select the test PDF
-                self.page.select_option('select', TEST_PDF)
-                time.sleep(3)  # Wait for PDF to load
-                return True
+            # The PDF panel's dropdown, not the form's Jump to Field select;
+            # select_option waits for it and picks the PDF in one call
+            self.page.select_option(PDF_DROPDOWN, TEST_PDF, timeout=5000)
+            # Wait for PDF to load and its first page to render
+            self.page.wait_for_load_state('networkidle')
+            self.page.wait_for_selector('canvas', state='visible', timeout=15000)
+            return True
         except:
-            print(f"  Could not find PDF dropdown or {TEST_PDF}")
+            log.warning(f"  Could not find PDF dropdown or {TEST_PDF}")
             return False
 
     def test_table_extraction_button_exists(self):
         """Test that table extraction UI exists"""
-        print("\n📊 Test: Table Extraction Button Exists")
+        log.info("\n📊 Test: Table Extraction Button Exists")
 
         self.navigate_to_app()
         self.load_test_pdf()
 
         # Click Tables tab
-        tables_tab = self.page.locator('button:has-text("Tables")')
-        tables_tab.click()
-        time.sleep(1)
+        self.switch_tab('Tables')
 
         # Check for Extract Tables button
         extract_button = self.page.locator('button:has-text("Extract Tables")')
-        assert extract_button.is_visible(), "Extract Tables button should be visible"
-        print("  ✅ Extract Tables button found")
+        expect(extract_button, "Extract Tables button should be visible").to_be_visible()
+        log.info("  ✅ Extract Tables button found")
 
     def test_figure_extraction_button_exists(self):
         """Test that figure extraction UI exists"""
-        print("\n🖼️ Test: Figure Extraction Button Exists")
+        log.info("\n🖼️ Test: Figure Extraction Button Exists")
 
         self.navigate_to_app()
         self.load_test_pdf()
 
         # Click Figures tab
-        figures_tab = self.page.locator('button:has-text("Figures")')
-        figures_tab.click()
-        time.sleep(1)
+        self.switch_tab('Figures')
 
         # Check for Extract Figures button
         extract_button = self.page.locator('button:has-text("Extract Figures")')
-        assert extract_button.is_visible(), "Extract Figures button should be visible"
-        print("  ✅ Extract Figures button found")
+        expect(extract_button, "Extract Figures button should be visible").to_be_visible()
+        log.info("  ✅ Extract Figures button found")
 
     def test_table_extraction_workflow(self):
         """Test complete table extraction workflow"""
-        print("\n📊 Test: Table Extraction Workflow")
+        log.info("\n📊 Test: Table Extraction Workflow")
 
         self.navigate_to_app()
         if not self.load_test_pdf():
-            print("  ⚠️ Skipping - no test PDF available")
+            log.warning("  ⚠️ Skipping - no test PDF available")
             return
 
         # Click Tables tab
-        tables_tab = self.page.locator('button:has-text("Tables")')
-        tables_tab.click()
-        time.sleep(1)
-
-        # Take screenshot before extraction
-        self.page.screenshot(path='test_screenshots/table_before_extract.png')
+        self.switch_tab('Tables')
 
-        # Click Extract Tables button
+        # Click Extract Tables button and wait for the Cloud Function's answer
         extract_button = self.page.locator('button:has-text("Extract Tables")')
-        extract_button.click()
-
-        # Wait for extraction (with timeout)
-        self.page.wait_for_selector('button:has-text("Extracting...")', timeout=5000, state='visible')
-        print("  ⏳ Extraction in progress...")
-
-        # Wait for completion
+        log.info("  ⏳ Extraction in progress...")
         try:
-            self.page.wait_for_selector('button:has-text("Extract Tables")', timeout=60000, state='visible')
-            print("  ✅ Extraction completed")
-        except:
-            print("  ⚠️ Extraction timed out or error occurred")
-
-        # Take screenshot after extraction
-        self.page.screenshot(path='test_screenshots/table_after_extract.png')
+            with self.page.expect_response(
+                lambda r: r.url.endswith('/extract_tables_enhanced') and r.request.method == 'POST',
+                timeout=60000
+            ) as response_info:
+                extract_button.click()
+            log.info(f"  ✅ Extraction completed (HTTP {response_info.value.status})")
+        except PlaywrightTimeoutError:
+            log.warning("  ⚠️ Extraction timed out")
 
         # Check for extracted tables
         extracted_tables = self.page.locator('text=Extracted Tables')
-        if extracted_tables.is_visible():
-            print("  ✅ Tables were extracted and displayed")
-        else:
+        try:
+            expect(extracted_tables).to_be_visible(timeout=5000)
+            log.info("  ✅ Tables were extracted and displayed")
+        except AssertionError:
             # Check for error message
             error_div = self.page.locator('[style*="ffe6e6"]')
             if error_div.is_visible():
-                print(f"  ❌ Error: {error_div.text_content()}")
+                log.error(f"  ❌ Error: {error_div.text_content()}")
             else:
-                print("  ⚠️ No tables found in PDF")
+                log.warning("  ⚠️ No tables found in PDF")
 
     def test_figure_extraction_workflow(self):
         """Test complete figure extraction workflow"""
-        print("\n🖼️ Test: Figure Extraction Workflow")
+        log.info("\n🖼️ Test: Figure Extraction Workflow")
 
         self.navigate_to_app()
         if not self.load_test_pdf():
-            print("  ⚠️ Skipping - no test PDF available")
+            log.warning("  ⚠️ Skipping - no test PDF available")
             return
 
         # Click Figures tab
-        figures_tab = self.page.locator('button:has-text("Figures")')
-        figures_tab.click()
-        time.sleep(1)
-
-        # Take screenshot before extraction
-        self.page.screenshot(path='test_screenshots/figure_before_extract.png')
+        self.switch_tab('Figures')
 
-        # Click Extract Figures button
+        # Click Extract Figures button and wait for the Cloud Function's answer
         extract_button = self.page.locator('button:has-text("Extract Figures")')
-        extract_button.click()
-
-        # Wait for extraction
-        self.page.wait_for_selector('button:has-text("Extracting...")', timeout=5000, state='visible')
-        print("  ⏳ Extraction in progress...")
-
-        # Wait for completion
+        log.info("  ⏳ Extraction in progress...")
         try:
-            self.page.wait_for_selector('button:has-text("Extract Figures")', timeout=60000, state='visible')
-            print("  ✅ Extraction completed")
-        except:
-            print("  ⚠️ Extraction timed out or error occurred")
-
-        # Take screenshot after extraction
-        self.page.screenshot(path='test_screenshots/figure_after_extract.png')
+            with self.page.expect_response(
+                lambda r: r.url.endswith('/extract_figures_enhanced') and r.request.method == 'POST',
+                timeout=60000
+            ) as response_info:
+                extract_button.click()
+            log.info(f"  ✅ Extraction completed (HTTP {response_info.value.status})")
+        except PlaywrightTimeoutError:
+            log.warning("  ⚠️ Extraction timed out")
 
         # Check for extracted figures
         extracted_figures = self.page.locator('text=Extracted Figures')
-        if extracted_figures.is_visible():
-            print("  ✅ Figures were extracted and displayed")
+        try:
+            expect(extracted_figures).to_be_visible(timeout=5000)
+            log.info("  ✅ Figures were extracted and displayed")
 
             # Check for images
             images = self.page.locator('img[src^="data:image"]')
             image_count = images.count()
-            print(f"  📷 Found {image_count} figure images")
-        else:
+            log.info(f"  📷 Found {image_count} figure images")
+        except AssertionError:
             # Check for error
             error_div = self.page.locator('[style*="ffe6e6"]')
             if error_div.is_visible():
-                print(f"  ❌ Error: {error_div.text_content()}")
+                log.error(f"  ❌ Error: {error_div.text_content()}")
             else:
-                print("  ⚠️ No figures found in PDF")
+                log.warning("  ⚠️ No figures found in PDF")
 
     def test_tab_switching(self):
         """Test switching between tabs"""
-        print("\n🔄 Test: Tab Switching")
+        log.info("\n🔄 Test: Tab Switching")
 
         self.navigate_to_app()
 
-        tabs = ['Form', 'Tables', 'Figures', 'Chat']
-        for tab_name in tabs:
-            tab_button = self.page.locator(f'button:has-text("{tab_name}")')
-            if tab_button.is_visible():
-                tab_button.click()
-                time.sleep(0.5)
-                print(f"  ✅ Switched to {tab_name} tab")
+        for tab_name in TAB_LOCATORS:
+            if self.page.is_visible(TAB_LOCATORS[tab_name]):
+                self.switch_tab(tab_name)
+                log.info(f"  ✅ Switched to {tab_name} tab")
             else:
-                print(f"  ⚠️ {tab_name} tab not found")
+                log.warning(f"  ⚠️ {tab_name} tab not found")
 
     def test_highlight_persistence(self):
         """Test that highlights persist across page reloads"""
-        print("\n💾 Test: Highlight Persistence")
+        log.info("\n💾 Test: Highlight Persistence")
 
         self.navigate_to_app()
         if not self.load_test_pdf():
-            print("  ⚠️ Skipping - no test PDF available")
+            log.warning("  ⚠️ Skipping - no test PDF available")
             return
 
+        # Compare the raw stored JSON; it is only parsed to count highlights
+        def stored_data():
+            return self.page.evaluate("() => localStorage.getItem('cerebellar_extraction_data') || ''")
+
         # Check if there are any highlights stored
-        initial_storage = self.page.evaluate('''() => {
-            const storage = localStorage.getItem('cerebellar_extraction_data');
-            return storage ? JSON.parse(storage) : null;
-        }''')
-
-        if initial_storage and 'highlights' in initial_storage:
-            highlight_count = sum(len(v) for v in initial_storage['highlights'].values())
-            print(f"  📌 Found {highlight_count} existing highlights")
+        initial_storage = stored_data()
+        highlights = json.loads(initial_storage).get('highlights') if initial_storage else None
+
+        if highlights:
+            highlight_count = sum(len(v) for v in highlights.values())
+            log.info(f"  📌 Found {highlight_count} existing highlights")
         else:
-            print("  📌 No existing highlights found")
+            log.info("  📌 No existing highlights found")
 
         # Reload the page
-        self.page.reload()
-        time.sleep(3)
+        self.page.reload(wait_until='networkidle')
 
         # Check if highlights persist
-        post_reload_storage = self.page.evaluate('''() => {
-            const storage = localStorage.getItem('cerebellar_extraction_data');
-            return storage ? JSON.parse(storage) : null;
-        }''')
-
-        if initial_storage == post_reload_storage:
-            print("  ✅ Highlights persisted after reload")
+        if stored_data() == initial_storage:
+            log.info("  ✅ Highlights persisted after reload")
         else:
-            print("  ⚠️ Highlight data changed after reload")
+            log.warning("  ⚠️ Highlight data changed after reload")
 
     def test_error_handling_no_pdf(self):
         """Test error handling when no PDF is loaded"""
-        print("\n⚠️ Test: Error Handling (No PDF)")
+        log.info("\n⚠️ Test: Error Handling (No PDF)")
 
         self.navigate_to_app()
 
         # Try Tables without loading PDF
-        tables_tab = self.page.locator('button:has-text("Tables")')
-        tables_tab.click()
-        time.sleep(1)
+        self.switch_tab('Tables')
 
         extract_button = self.page.locator('button:has-text("Extract Tables")')
 
         # Button should be disabled or show error when clicked
         is_disabled = extract_button.is_disabled()
-        print(f"  Extract Tables button disabled: {is_disabled}")
+        log.info(f"  Extract Tables button disabled: {is_disabled}")
 
         if not is_disabled:
             extract_button.click()
-            time.sleep(1)
 
             # Check for error message
-            error_div = self.page.locator('text=Please upload a PDF')
-            if error_div.is_visible():
-                print("  ✅ Appropriate error message shown")
-            else:
-                print("  ⚠️ No error message shown")
-
-
-def run_all_tests():
-    """Run all integration tests"""
-    print("\n" + "=" * 70)
-    print("  Cerebellar Extraction Integration Tests")
-    print("=" * 70)
-
-    # Create screenshots directory
-    os.makedirs('test_screenshots', exist_ok=True)
-
-    test_instance = TestExtractionIntegration()
-
-    tests = [
-        test_instance.test_table_extraction_button_exists,
-        test_instance.test_figure_extraction_button_exists,
-        test_instance.test_tab_switching,
-        test_instance.test_error_handling_no_pdf,
-        test_instance.test_table_extraction_workflow,
-        test_instance.test_figure_extraction_workflow,
-        test_instance.test_highlight_persistence,
-    ]
-
-    passed = 0
-    failed = 0
-
-    for test in tests:
-        try:
-            test_instance.setup_method()
-            test()
-            passed += 1
-        except Exception as e:
-            failed += 1
-            print(f"  ❌ FAILED: {e}")
-        finally:
-            test_instance.teardown_method()
-
-    print("\n" + "=" * 70)
-    print(f"  Results: {passed} passed, {failed} failed")
-    print("=" * 70)
+            try:
+                expect(self.page.locator('text=Please upload a PDF')).to_be_visible(timeout=3000)
+                log.info("  ✅ Appropriate error message shown")
+            except AssertionError:
+                log.warning("  ⚠️ No error message shown")
 
-    return failed == 0
 
 
 if __name__ == '__main__':
-    success = run_all_tests()
-    exit(0 if success else 1)
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -6,62 +6,188 @@ Tests the capture_highlights and generate_html_report Python Cloud Functions
 """
 
 import base64
+import io
 import json
 import requests
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cache
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib json module
+    orjson = None
+
+try:
+    import pybase64
+except ImportError:  # optional: falls back to the stdlib codec
+    pybase64 = None
 
 # Configuration
 FUNCTIONS_URL = "http://127.0.0.1:5001/cerebellar-sdc/us-central1"
+# Saved screenshot and report; created once here rather than in each test
+OUT_DIR = Path('test_screenshots').resolve()
+OUT_DIR.mkdir(exist_ok=True)
+
+# One pooled session for all tests, so connections to the emulator are reused;
+# the pool is big enough for every test to have a request in flight at once
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=8))
+# Every body is pre-encoded JSON; requests already asks for gzip by default
+SESSION.headers.update({'Content-Type': 'application/json'})
+
+RULE = "=" * 60
+RULE_WIDE = "=" * 70
+
+
+def quick_result(response):
+    """Judge a call by its HTTP status alone, without parsing the body; errors come back as 4xx/5xx"""
+    print(f"{'✅' if response.ok else '❌'} HTTP {response.status_code} in {response.elapsed.total_seconds():.1f}s")
+    return response.ok
+
+
+def print_banner(title, rule=RULE):
+    """Print title between two rules in a single write"""
+    print(f"\n{rule}\n{title}\n{rule}")
+
+
+def encode_json(payload):
+    """Serialize a request body to bytes (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+def with_pdf(pdf_base64, payload):
+    """
+    Splice pdf_base64 into a payload that encode_json has already serialized.
+
+    base64 never needs JSON escaping, so the PDF string is copied in as is
+    and the rest of the body isn't re-encoded on every request.
+    """
+    return b'{"pdf_base64":"' + pdf_base64.encode('ascii') + b'",' + payload[1:]
 
 
+def decode_json(response):
+    """Parse a response body straight from its bytes (orjson when available)"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return json.loads(response.content)
+
+
+# Everything each function is sent apart from the PDF, serialized once;
+# with_pdf() adds the PDF at request time
+TABLES_PAYLOAD = encode_json({"detect_captions": True})
+FIGURES_PAYLOAD = encode_json({"min_size": 50, "dpi": 150})
+CAPTURE_PAYLOAD = encode_json({
+    "highlights": [
+        {
+            "page": 1,
+            "text": "Test highlight text",
+            "x0": 100, "y0": 200, "x1": 300, "y1": 220,
+            "label": "Test Label"
+        }
+    ],
+    "dpi": 200,
+    "padding": 15
+})
+REPORT_PAYLOAD = encode_json({
+    "extraction_data": {
+        "metadata": {
+            "firstAuthor": "Kim et al.",
+            "publicationYear": 2016,
+            "hospitalCenter": "Test Hospital",
+            "studyPeriod": "2010-2015"
+        },
+        "population": {
+            "sampleSize": 100,
+            "age": {
+                "value": 62.5,
+                "sourceText": "mean age was 62.5 years"
+            }
+        },
+        "outcomes": {
+            "mortality": {
+                "value": 15.3,
+                "sourceText": "mortality rate was 15.3%"
+            }
+        }
+    },
+    "highlights": [
+        {
+            "page": 1,
+            "text": "mortality rate was 15.3%",
+            "x0": 100, "y0": 200, "x1": 300, "y1": 220,
+            "label": "Mortality"
+        }
+    ],
+    "title": "Test Extraction Report",
+    "dpi": 150,
+    "padding": 20
+})
+
+
+@cache
 def load_test_pdf():
-    """Load a test PDF from public/pdf directory"""
+    """Load a test PDF from public/pdf directory, base64-encoded; read and encoded once per run"""
     pdf_dir = Path(__file__).parent.parent / "public" / "pdf"
 
-    # Find first PDF file
-    pdf_files = list(pdf_dir.glob("*.pdf"))
-    if not pdf_files:
+    # Find first PDF file; stops at the first match instead of listing them all
+    pdf_path = None
+    if pdf_dir.is_dir():
+        with os.scandir(pdf_dir) as entries:
+            pdf_path = next(
+                (Path(e.path) for e in entries if e.name.endswith('.pdf') and e.is_file()), None
+            )
+    if pdf_path is None:
         print("❌ No PDF files found in public/pdf/")
         return None
 
-    pdf_path = pdf_files[0]
     print(f"📄 Loading test PDF: {pdf_path.name}")
 
     with open(pdf_path, 'rb') as f:
         pdf_bytes = f.read()
 
-    return base64.b64encode(pdf_bytes).decode('utf-8')
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(pdf_bytes)
+    return base64.b64encode(pdf_bytes).decode('ascii')
 
 
-def test_extract_tables_enhanced():
+def test_extract_tables_enhanced(verbose=True):
     """Test enhanced table extraction"""
-    print("\n" + "=" * 60)
-    print("TEST: extract_tables_enhanced")
-    print("=" * 60)
+    print_banner("TEST: extract_tables_enhanced")
 
     pdf_base64 = load_test_pdf()
     if not pdf_base64:
         return False
 
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{FUNCTIONS_URL}/extract_tables_enhanced",
-            json={"pdf_base64": pdf_base64, "detect_captions": True},
+            data=with_pdf(pdf_base64, TABLES_PAYLOAD),
             timeout=120
         )
 
-        result = response.json()
+        if not verbose:
+            return quick_result(response)
+
+        result = decode_json(response)
 
         if result.get('success'):
             print(f"✅ Success! Found {result.get('table_count', 0)} tables")
             for i, table in enumerate(result.get('tables', [])[:3]):  # Show first 3
+                caption = table.get('caption') or 'No caption'
+                headers = table.get('headers')
                 print(f"\n  Table {i+1}:")
                 print(f"    Page: {table.get('page')}")
-                print(f"    Caption: {table.get('caption', 'No caption')[:50]}...")
+                print(f"    Caption: {caption[:50]}...")
                 print(f"    Rows: {table.get('row_count')}, Columns: {table.get('column_count')}")
-                if table.get('headers'):
-                    print(f"    Headers: {table.get('headers')[:3]}...")
+                if headers:
+                    print(f"    Headers: {headers[:3]}...")
             return True
         else:
             print(f"❌ Error: {result.get('error')}")
@@ -76,31 +202,32 @@ def test_extract_tables_enhanced():
         return False
 
 
-def test_extract_figures_enhanced():
+def test_extract_figures_enhanced(verbose=True):
     """Test enhanced figure extraction"""
-    print("\n" + "=" * 60)
-    print("TEST: extract_figures_enhanced")
-    print("=" * 60)
+    print_banner("TEST: extract_figures_enhanced")
 
     pdf_base64 = load_test_pdf()
     if not pdf_base64:
         return False
 
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{FUNCTIONS_URL}/extract_figures_enhanced",
-            json={"pdf_base64": pdf_base64, "min_size": 50, "dpi": 150},
+            data=with_pdf(pdf_base64, FIGURES_PAYLOAD),
             timeout=180
         )
 
-        result = response.json()
+        if not verbose:
+            return quick_result(response)
+
+        result = decode_json(response)
 
         if result.get('success'):
             print(f"✅ Success! Found {result.get('figure_count', 0)} figures")
             for i, figure in enumerate(result.get('figures', [])[:3]):  # Show first 3
                 print(f"\n  Figure {i+1}:")
                 print(f"    Page: {figure.get('page')}")
-                print(f"    Caption: {figure.get('caption', 'No caption')[:50]}...")
+                print(f"    Caption: {(figure.get('caption') or 'No caption')[:50]}...")
                 print(f"    Size: {figure.get('width')}x{figure.get('height')} px")
                 print(f"    Format: {figure.get('format')}")
                 print(f"    Has image data: {'Yes' if figure.get('image_base64') else 'No'}")
@@ -117,39 +244,25 @@ def test_extract_figures_enhanced():
         return False
 
 
-def test_capture_highlights():
+def test_capture_highlights(verbose=True):
     """Test highlight capture"""
-    print("\n" + "=" * 60)
-    print("TEST: capture_highlights")
-    print("=" * 60)
+    print_banner("TEST: capture_highlights")
 
     pdf_base64 = load_test_pdf()
     if not pdf_base64:
         return False
 
-    # Create sample highlights
-    highlights = [
-        {
-            "page": 1,
-            "text": "Test highlight text",
-            "x0": 100, "y0": 200, "x1": 300, "y1": 220,
-            "label": "Test Label"
-        }
-    ]
-
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{FUNCTIONS_URL}/capture_highlights",
-            json={
-                "pdf_base64": pdf_base64,
-                "highlights": highlights,
-                "dpi": 200,
-                "padding": 15
-            },
+            data=with_pdf(pdf_base64, CAPTURE_PAYLOAD),
             timeout=180
         )
 
-        result = response.json()
+        if not verbose:
+            return quick_result(response)
+
+        result = decode_json(response)
 
         if result.get('success'):
             screenshots = result.get('screenshots', [])
@@ -163,10 +276,14 @@ def test_capture_highlights():
 
             # Save first screenshot
             if screenshots and screenshots[0].get('image_base64'):
-                os.makedirs('test_screenshots', exist_ok=True)
-                with open('test_screenshots/highlight_capture.png', 'wb') as f:
-                    f.write(base64.b64decode(screenshots[0]['image_base64']))
-                print("\n  💾 Saved screenshot to test_screenshots/highlight_capture.png")
+                b64decode = pybase64.b64decode if pybase64 is not None else base64.b64decode
+                # Default format is WEBP, so name the file after what came back
+                ext = screenshots[0].get('mime_type', 'image/png').split('/')[1]
+                filename = f'highlight_capture.{ext}'
+                # The decoded image is written with a single unbuffered write
+                with open(OUT_DIR / filename, 'wb', buffering=0) as f:
+                    f.write(b64decode(screenshots[0]['image_base64']))
+                print(f"\n  💾 Saved screenshot to test_screenshots/{filename}")
 
             return True
         else:
@@ -181,63 +298,25 @@ def test_capture_highlights():
         return False
 
 
-def test_generate_html_report():
+def test_generate_html_report(verbose=True):
     """Test HTML report generation"""
-    print("\n" + "=" * 60)
-    print("TEST: generate_html_report")
-    print("=" * 60)
+    print_banner("TEST: generate_html_report")
 
     pdf_base64 = load_test_pdf()
     if not pdf_base64:
         return False
 
-    # Sample extraction data
-    extraction_data = {
-        "metadata": {
-            "firstAuthor": "Kim et al.",
-            "publicationYear": 2016,
-            "hospitalCenter": "Test Hospital",
-            "studyPeriod": "2010-2015"
-        },
-        "population": {
-            "sampleSize": 100,
-            "age": {
-                "value": 62.5,
-                "sourceText": "mean age was 62.5 years"
-            }
-        },
-        "outcomes": {
-            "mortality": {
-                "value": 15.3,
-                "sourceText": "mortality rate was 15.3%"
-            }
-        }
-    }
-
-    highlights = [
-        {
-            "page": 1,
-            "text": "mortality rate was 15.3%",
-            "x0": 100, "y0": 200, "x1": 300, "y1": 220,
-            "label": "Mortality"
-        }
-    ]
-
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{FUNCTIONS_URL}/generate_html_report",
-            json={
-                "pdf_base64": pdf_base64,
-                "extraction_data": extraction_data,
-                "highlights": highlights,
-                "title": "Test Extraction Report",
-                "dpi": 150,
-                "padding": 20
-            },
+            data=with_pdf(pdf_base64, REPORT_PAYLOAD),
             timeout=300
         )
 
-        result = response.json()
+        if not verbose:
+            return quick_result(response)
+
+        result = decode_json(response)
 
         if result.get('success'):
             print(f"✅ Success!")
@@ -245,9 +324,9 @@ def test_generate_html_report():
             print(f"  Timestamp: {result.get('timestamp')}")
 
             # Save HTML report
-            os.makedirs('test_screenshots', exist_ok=True)
-            with open('test_screenshots/test_report.html', 'w', encoding='utf-8') as f:
-                f.write(result.get('html', ''))
+            # Encode the whole report once rather than through a text-mode writer
+            with open(OUT_DIR / 'test_report.html', 'wb', buffering=1 << 20) as f:
+                f.write(result.get('html', '').encode('utf-8'))
             print("\n  💾 Saved HTML report to test_screenshots/test_report.html")
             print("     Open in browser: open test_screenshots/test_report.html")
 
@@ -264,12 +343,28 @@ def test_generate_html_report():
         return False
 
 
-def run_all_tests():
-    """Run all tests"""
-    print("\n" + "=" * 70)
-    print("  HTML Report Generation Tests")
-    print("  Make sure Firebase emulators are running!")
-    print("=" * 70)
+class _PerThreadStdout:
+    """sys.stdout stand-in that sends each worker thread's prints to its own buffer"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        return getattr(self.local, 'buffer', self.stream).write(text)
+
+    def flush(self):
+        getattr(self.local, 'buffer', self.stream).flush()
+
+
+def run_all_tests(verbose=True):
+    """
+    Run all tests concurrently; each test's output is printed in one piece once it finishes.
+
+    With verbose=False each test only checks the HTTP status, so the run
+    measures the functions rather than parsing and printing their results.
+    """
+    print_banner("  HTML Report Generation Tests\n  Make sure Firebase emulators are running!", RULE_WIDE)
 
     tests = [
         ("Table Extraction Enhanced", test_extract_tables_enhanced),
@@ -281,23 +376,42 @@ def run_all_tests():
     passed = 0
     failed = 0
 
-    for name, test_func in tests:
+    stdout = _PerThreadStdout(sys.stdout)
+
+    def run(name, test_func):
+        stdout.local.buffer = io.StringIO()
         try:
-            if test_func():
-                passed += 1
-            else:
-                failed += 1
+            ok = bool(test_func(verbose=verbose))
         except Exception as e:
-            failed += 1
+            ok = False
             print(f"  ❌ {name} raised exception: {e}")
+        return ok, stdout.local.buffer.getvalue()
+
+    # Fill the PDF cache up front so the threads don't all read it at once
+    load_test_pdf()
 
-    print("\n" + "=" * 70)
-    print(f"  Results: {passed} passed, {failed} failed")
-    print("=" * 70)
+    # The tests are independent POSTs, so the run takes about as long as the
+    # slowest one rather than the sum of all four
+    sys.stdout = stdout
+    try:
+        with ThreadPoolExecutor(max_workers=len(tests)) as pool:
+            futures = [pool.submit(run, name, test_func) for name, test_func in tests]
+            for future in as_completed(futures):
+                ok, output = future.result()
+                stdout.stream.write(output)
+                if ok:
+                    passed += 1
+                else:
+                    failed += 1
+    finally:
+        sys.stdout = stdout.stream
+
+    print_banner(f"  Results: {passed} passed, {failed} failed", RULE_WIDE)
 
     return failed == 0
 
 
 if __name__ == '__main__':
-    success = run_all_tests()
+    # QUICK=1 for a status-only smoke run
+    success = run_all_tests(verbose=not os.environ.get('QUICK'))
     exit(0 if success else 1)